@@ -0,0 +1,114 @@
+""" Per-request overhead of the orders auth middleware, before and after the move to raw ASGI
+
+Wraps a route that does nothing with the previous BaseHTTPMiddleware implementation and
+with the current AuthorizeRequestMiddleware, and drives them with direct ASGI calls:
+
+    python benchmarks/auth_middleware.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from orders.web.api import auth  # noqa: E402
+from orders.web.app import AuthorizeRequestMiddleware  # noqa: E402
+
+
+class BaseHTTPAuthorizeRequestMiddleware(BaseHTTPMiddleware):
+    """ The previous implementation, reading AUTH_ON on every request """
+
+    async def dispatch(self, request, call_next):
+        if os.getenv("AUTH_ON", "False") != "True":
+            request.state.user_id = "test"
+            return await call_next(request)
+        bearer_token = request.headers.get("Authorization")
+        token_payload = auth.validate_token_cached(bearer_token.split(" ")[1].strip())
+        request.state.user_id = token_payload["sub"]
+        return await call_next(request)
+
+
+def build_app(middleware, **options):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    if middleware is not None:
+        app.add_middleware(middleware, **options)
+    return app
+
+
+async def run(app, requests, headers):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "server": ("127.0.0.1", 8000),
+        "client": ("127.0.0.1", 50000),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    # A throwaway key pair, so that the benchmark does not need the private key of the service
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    auth.public_key = private_key.public_key()
+    token = jwt.encode(
+        {"sub": "benchmark", "aud": "http://127.0.0.1:8000/orders", "exp": time.time() + 3600},
+        private_key,
+        algorithm="RS256",
+    )
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+
+    cases = [
+        ("no middleware", None, {}),
+        ("BaseHTTPMiddleware, auth off", BaseHTTPAuthorizeRequestMiddleware, {}),
+        ("ASGI middleware, auth off", AuthorizeRequestMiddleware, {"auth_on": False}),
+        ("BaseHTTPMiddleware, auth on", BaseHTTPAuthorizeRequestMiddleware, {}),
+        ("ASGI middleware, auth on", AuthorizeRequestMiddleware, {"auth_on": True}),
+    ]
+    baseline = None
+    for name, middleware, options in cases:
+        # The previous implementation reads AUTH_ON from the environment on every request
+        os.environ["AUTH_ON"] = "True" if name.endswith("auth on") else "False"
+        app = build_app(middleware, **options)
+        # Warm up, so that the token is cached and the routes are compiled
+        asyncio.run(run(app, 1000, headers))
+        per_request = asyncio.run(run(app, args.requests, headers))
+        baseline = per_request if baseline is None else baseline
+        print(f"{name:30} {per_request:8.1f} us/request  (+{per_request - baseline:.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+""" Memory footprint of the order domain objects built for a large listing
+
+Seeds an in-memory SQLite database, loads the orders with their items, then measures with
+tracemalloc the memory held by the domain objects built from the records, and the peak
+while they are serialized into response dicts. The previous dict-based classes are measured
+next to the slotted ones, and the two-query list_dicts path is measured from the rows up:
+
+    python benchmarks/domain_objects.py --orders 10000
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import selectinload, sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from orders.orders_service.orders import Order  # noqa: E402
+from orders.repository import models  # noqa: E402
+from orders.repository.orders_repository import OrdersRepository  # noqa: E402
+
+
+class DictOrderItem:
+    """ The previous order item, with a __dict__ per instance """
+
+    def __init__(self, id, product, quantity, size):
+        self.id = id
+        self.product = product
+        self.quantity = quantity
+        self.size = size
+
+    def dict(self):
+        return {'product': self.product, 'size': self.size, 'quantity': int(self.quantity)}
+
+
+class DictOrder:
+    """ The previous order, built from the dict of its record """
+
+    def __init__(self, id, created, items, status, schedule_id=None, delivery_id=None, user_id=None, version=None, order_=None):
+        self._order = order_
+        self._id = id
+        self.user_id = user_id
+        self.version = version
+        self._created = created
+        self.items = [DictOrderItem(**item) for item in items]
+        self._status = status
+        self.schedule_id = schedule_id
+        self.delivery_id = delivery_id
+
+    def dict(self):
+        return {
+            'id': self._id,
+            'order': [item.dict() for item in self.items],
+            'status': self._status,
+            'created': self._created,
+        }
+
+
+def seed(session, orders, items_per_order):
+    session.add_all(
+        models.OrderModel(
+            user_id="benchmark",
+            items=[
+                models.OrderItemModel(product="latte", size="big", quantity="1")
+                for _ in range(items_per_order)
+            ],
+        )
+        for _ in range(orders)
+    )
+    session.commit()
+
+
+def measure(build, serialize=None):
+    """ Return the bytes held by what build() returns, the peak while it is built, and the peak while it is serialized """
+    gc.collect()
+    tracemalloc.start()
+    objects = build()
+    held, build_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    if serialize is not None:
+        serialize(objects)
+    serialize_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return held, build_peak, serialize_peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=2, help="items per order")
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    seed(session, args.orders, args.items)
+    records = (
+        session.query(models.OrderModel).options(selectinload(models.OrderModel.items)).all()
+    )
+
+    def serialize(orders):
+        return [order.dict() for order in orders]
+
+    cases = [
+        ("record.dict() + dict-based Order", lambda: [DictOrder(**record.dict()) for record in records], serialize),
+        ("Order.from_record, slotted", lambda: [Order.from_record(record) for record in records], serialize),
+        # Rows are fetched inside the measurement, there are no records nor domain objects
+        ("list_dicts from rows", lambda: OrdersRepository(session).list_dicts(), None),
+    ]
+    print(f"{args.orders} orders with {args.items} items each")
+    for name, build, serializer in cases:
+        held, build_peak, serialize_peak = measure(build, serializer)
+        line = f"{name:34} {held / args.orders:6.0f} B/order held, {build_peak / args.orders:6.0f} peak while built"
+        if serializer is not None:
+            line += f", {serialize_peak / args.orders:6.0f} peak while serialized"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
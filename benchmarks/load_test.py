@@ -0,0 +1,439 @@
+""" Load test of the orders and kitchen services with a realistic mix of requests
+
+Starts the kitchen app, a stub of the payments service and the orders app under uvicorn on
+localhost, with the orders stored in a fresh SQLite database. Concurrent clients then replay a
+weighted mix of order operations, and the latency percentiles, throughput and error rate of
+each endpoint are reported as JSON:
+
+    python benchmarks/load_test.py --concurrency 32 --seconds 30 --mix create=30,list=20,get=30,pay=15,cancel=5
+
+Paid orders go through the outbox, which charges them on the payments stub and schedules them
+in the kitchen, so the background work of the orders service is part of the load. The kitchen
+can be loaded directly too, with the schedules (list) and schedule (create) operations.
+Running services are targeted with --orders-url and --kitchen-url instead, and the integration
+stats of a running orders service are read with its ORDERS_ADMIN_TOKEN, from --admin-token.
+
+A report saved as a baseline is compared with later runs, which exit with status 1 when an
+endpoint regressed by more than the tolerance. Baselines only compare runs on the same host:
+
+    python benchmarks/load_test.py --save-baseline baseline.json
+    python benchmarks/load_test.py --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from orders.repository import models  # noqa: E402
+
+DEFAULT_MIX = "create=30,list=20,get=30,pay=15,cancel=5"
+ITEMS = [{"product": "latte", "size": "big", "quantity": 1}, {"product": "tea", "size": "small", "quantity": 2}]
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+    """ Latencies and response statuses of the requests, per endpoint """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    def record(self, endpoint, latency, status):
+        self.latencies[endpoint].append(latency)
+        self.statuses[endpoint][status] += 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors[endpoint] += 1
+
+    def report(self, seconds):
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "errors": self.errors[endpoint],
+                "error_rate": self.errors[endpoint] / len(latencies),
+                "throughput": len(latencies) / seconds,
+                "latency_ms": {
+                    **{f"p{p}": percentile(latencies, p) * 1000 for p in PERCENTILES},
+                    "mean": sum(latencies) / len(latencies) * 1000,
+                    "max": latencies[-1] * 1000,
+                },
+                "statuses": {str(status): count for status, count in sorted(self.statuses[endpoint].items(), key=str)},
+            }
+        requests = sum(endpoint["requests"] for endpoint in endpoints.values())
+        errors = sum(self.errors.values())
+        return {
+            "total": {
+                "requests": requests,
+                "errors": errors,
+                "error_rate": errors / requests if requests else 0.0,
+                "throughput": requests / seconds,
+            },
+            "endpoints": endpoints,
+        }
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of sorted values """
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+class Workload:
+    """ The operations of the mix, on the orders placed during the run
+
+    Orders that are neither paid nor cancelled are kept apart, and each of them is taken by
+    a single pay or cancel, so that the mix never produces conflicts of its own.
+    """
+
+    def __init__(self, orders, kitchen, recorder):
+        self.orders = orders
+        self.kitchen = kitchen
+        self.recorder = recorder
+        self.placed = []
+        self.open = []
+
+    async def request(self, endpoint, client, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as error:
+            self.recorder.record(endpoint, time.perf_counter() - start, type(error).__name__)
+            return None
+        self.recorder.record(endpoint, time.perf_counter() - start, response.status_code)
+        return response
+
+    async def create(self):
+        response = await self.request("POST /orders", self.orders, "POST", "/orders", json={"order": ITEMS})
+        if response is not None and response.status_code == 201:
+            order_id = response.json()["id"]
+            self.placed.append(order_id)
+            self.open.append(order_id)
+
+    async def list(self):
+        await self.request("GET /orders", self.orders, "GET", "/orders", params={"limit": 20})
+
+    async def get(self):
+        if not self.placed:
+            return await self.create()
+        order_id = random.choice(self.placed)
+        await self.request("GET /orders/{order_id}", self.orders, "GET", f"/orders/{order_id}")
+
+    async def pay(self):
+        if not self.open:
+            return await self.create()
+        order_id = self.open.pop(random.randrange(len(self.open)))
+        await self.request("POST /orders/{order_id}/pay", self.orders, "POST", f"/orders/{order_id}/pay")
+
+    async def cancel(self):
+        if not self.open:
+            return await self.create()
+        order_id = self.open.pop(random.randrange(len(self.open)))
+        await self.request("POST /orders/{order_id}/cancel", self.orders, "POST", f"/orders/{order_id}/cancel")
+
+    async def schedules(self):
+        await self.request("GET /kitchen/schedules", self.kitchen, "GET", "/kitchen/schedules", params={"limit": 20})
+
+    async def schedule(self):
+        await self.request("POST /kitchen/schedules", self.kitchen, "POST", "/kitchen/schedules", json={"order": ITEMS})
+
+
+OPERATIONS = ["create", "list", "get", "pay", "cancel", "schedules", "schedule"]
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name.strip()!r}, expected one of {', '.join(OPERATIONS)}")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+async def client(workload, mix, deadline):
+    operations = [getattr(workload, name) for name in mix]
+    weights = list(mix.values())
+    while time.perf_counter() < deadline:
+        await random.choices(operations, weights)[0]()
+
+
+async def run_load(args, orders_url, kitchen_url):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=orders_url, limits=limits, timeout=args.timeout) as orders, \
+            httpx.AsyncClient(base_url=kitchen_url, limits=limits, timeout=args.timeout) as kitchen:
+        workload = Workload(orders, kitchen, Recorder())
+        # Orders to get, pay and cancel from the start, then a warm-up that is not reported
+        await asyncio.gather(*(workload.create() for _ in range(args.seed_orders)))
+        deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(*(client(workload, args.mix, deadline) for _ in range(args.concurrency)))
+
+        workload.recorder = Recorder()
+        start = time.perf_counter()
+        await asyncio.gather(*(client(workload, args.mix, start + args.seconds) for _ in range(args.concurrency)))
+        report = workload.recorder.report(time.perf_counter() - start)
+        # Calls of the orders service to the kitchen and payments, made by the pay and cancel operations
+        response = await orders.get("/integrations/stats", headers={"X-Admin-Token": args.admin_token or ""})
+        if response.status_code == 200:
+            report["integrations"] = response.json()
+        return report
+
+
+def compare(report, baseline, tolerance):
+    """ Return the regressions of a report against a baseline """
+    regressions = []
+    for endpoint, base in baseline["endpoints"].items():
+        current = report["endpoints"].get(endpoint)
+        if current is None:
+            continue
+        for p in PERCENTILES:
+            key = f"p{p}"
+            if current["latency_ms"][key] > base["latency_ms"][key] * (1 + tolerance):
+                regressions.append(
+                    f"{endpoint}: {key} {current['latency_ms'][key]:.1f} ms, baseline {base['latency_ms'][key]:.1f} ms"
+                )
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{endpoint}: throughput {current['throughput']:.1f}/s, baseline {base['throughput']:.1f}/s"
+            )
+        # Error rates are compared in absolute terms, a baseline usually has none
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(
+                f"{endpoint}: error rate {current['error_rate']:.2%}, baseline {base['error_rate']:.2%}"
+            )
+    return regressions
+
+
+class PaymentsStub(BaseHTTPRequestHandler):
+    """ Accepts every payment after a fixed delay, like the payments API on a good day
+
+    Payments are charged once per Idempotency-Key, as payments.yaml requires.
+    """
+
+    delay = 0.0
+    # Payment ids by idempotency key
+    payments = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        self._send(200, {"status": "ok"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.delay)
+        key = self.headers.get("Idempotency-Key")
+        with self.lock:
+            payment_id = self.payments.get(key) if key else None
+            if payment_id is None:
+                payment_id = str(uuid.uuid4())
+                if key:
+                    self.payments[key] = payment_id
+        self._send(201, {"payment_id": payment_id, "status": "paid"})
+
+    def _send(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PaymentsServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    # The outbox sends its payments in bursts
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Connections are dropped when the orders app stops
+        pass
+
+
+def serve(service, port, payments_delay):
+    """ Serve the kitchen app or the payments stub until the process is terminated """
+    if service == "payments":
+        PaymentsStub.delay = payments_delay
+        # HTTP/1.1 keeps the connections of the orders service alive
+        PaymentsStub.protocol_version = "HTTP/1.1"
+        PaymentsServer(("127.0.0.1", port), PaymentsStub).serve_forever()
+        return
+
+    # The kitchen imports its modules relative to its own directory
+    sys.path.insert(0, str(ROOT / "kitchen"))
+    os.chdir(ROOT / "kitchen")
+    from werkzeug.serving import make_server
+
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server of {url} exited with status {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"The server of {url} did not start")
+
+
+def start_services(args, directory):
+    """ Start the services that are not given by URL, return their URLs and processes """
+    processes = []
+    orders_url, kitchen_url = args.orders_url, args.kitchen_url
+
+    def start(command, url, health, **kwargs):
+        process = subprocess.Popen(command, cwd=ROOT, **kwargs)
+        processes.append(process)
+        wait_until_up(url + health, process)
+
+    try:
+        if kitchen_url is None:
+            port = free_port()
+            kitchen_url = f"http://127.0.0.1:{port}"
+            start([sys.executable, __file__, "--serve", "kitchen", "--port", str(port)], kitchen_url, "/kitchen/schedules?limit=1")
+        if orders_url is None:
+            port = free_port()
+            payments_url = f"http://127.0.0.1:{port}"
+            start(
+                [sys.executable, __file__, "--serve", "payments", "--port", str(port),
+                 "--payments-delay", str(args.payments_delay)],
+                payments_url, "/",
+            )
+
+            database = directory / "orders.db"
+            engine = create_engine(f"sqlite:///{database}")
+            models.Base.metadata.create_all(engine)
+            engine.dispose()
+            port = free_port()
+            orders_url = f"http://127.0.0.1:{port}"
+            env = dict(
+                os.environ,
+                ORDERS_DATABASE_URL=f"sqlite:///{database}",
+                AUTH_ON="False",
+                KITCHEN_API_URL=f"{kitchen_url}/kitchen",
+                PAYMENTS_API_URL=payments_url,
+                WEB_CONCURRENCY=str(args.workers),
+                ORDERS_ADMIN_TOKEN=args.admin_token,
+            )
+            start(
+                [sys.executable, "-m", "uvicorn", "orders.web.app:app", "--port", str(port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                orders_url, "/openapi/orders.json", env=env,
+            )
+    except BaseException:
+        stop_services(processes)
+        raise
+    return orders_url, kitchen_url, processes
+
+
+def stop_services(processes):
+    # The orders app goes first, so that its outbox does not fail against stopped services
+    for process in reversed(processes):
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"weights of the operations, among {', '.join(OPERATIONS)} (default {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=20, help="duration of the measurement")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before the measurement")
+    parser.add_argument("--seed-orders", type=int, default=100, help="orders placed before the warm-up")
+    parser.add_argument("--timeout", type=float, default=30, help="timeout of each request")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the orders app")
+    parser.add_argument("--payments-delay", type=float, default=0.02, help="seconds the payments stub takes per payment")
+    parser.add_argument("--orders-url", help="URL of a running orders service, instead of starting one")
+    parser.add_argument("--kitchen-url", help="URL of a running kitchen service, instead of starting one")
+    parser.add_argument("--admin-token", default=os.getenv("ORDERS_ADMIN_TOKEN"),
+                        help="admin token of the orders service, to read its integration stats")
+    parser.add_argument("--output", help="write the report to this file instead of stdout")
+    parser.add_argument("--save-baseline", metavar="PATH", help="save the report as a baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare the report with a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative regression allowed against the baseline")
+    parser.add_argument("--serve", choices=["kitchen", "payments"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+
+    if args.serve:
+        return serve(args.serve, args.port, args.payments_delay)
+    if args.orders_url is None and args.admin_token is None:
+        args.admin_token = secrets.token_hex(16)
+
+    with tempfile.TemporaryDirectory() as directory:
+        orders_url, kitchen_url, processes = start_services(args, Path(directory))
+        try:
+            results = asyncio.run(run_load(args, orders_url, kitchen_url))
+        finally:
+            stop_services(processes)
+
+    report = {
+        "config": {
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "workers": args.workers,
+            "payments_delay": args.payments_delay,
+        },
+        **results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(output + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline["config"] != report["config"]:
+            print("warning: the baseline was run with another configuration", file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+""" Cost per request of the metrics, in each ORDERS_METRICS mode
+
+Seeds a scratch SQLite database, then drives the orders app with direct ASGI calls to
+GET /orders and GET /orders/{order_id} with the metrics off, basic and full, and reports the
+throughput of each mode and the time it adds to every request compared with no metrics.
+The modes are measured in turn over several rounds and the best round of each is kept, so
+that a slow spell of the host does not land on a single mode:
+
+    python benchmarks/metrics_overhead.py --seconds 1 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DATABASE = Path(tempfile.mkdtemp()) / "orders.db"
+# The engines are created from the configuration, which is read when the app is imported
+os.environ["ORDERS_DATABASE_URL"] = f"sqlite:///{DATABASE}"
+os.environ["AUTH_ON"] = "False"
+# Every read goes to the database, so that the queries are timed
+os.environ["ORDERS_ORDER_CACHE_BACKEND"] = "off"
+
+from orders.config import BaseConfig  # noqa: E402
+from orders.repository import models  # noqa: E402
+from orders.repository.orders_repository import _bulk_rows  # noqa: E402
+from orders.repository.unit_of_work import dispose_async_engine  # noqa: E402
+from orders.web.app import app  # noqa: E402
+
+MODES = ["off", "basic", "full"]
+
+
+def seed(orders):
+    engine = create_engine(os.environ["ORDERS_DATABASE_URL"])
+    models.Base.metadata.create_all(engine)
+    items = [{"product": "latte", "size": "big", "quantity": 1}]
+    # The middleware sets the user to test when authorization is off
+    order_rows, item_rows, _ = _bulk_rows([items] * orders, "test")
+    with engine.begin() as connection:
+        connection.execute(insert(models.OrderModel), order_rows)
+        connection.execute(insert(models.OrderItemModel), item_rows)
+    engine.dispose()
+    return order_rows[0]["id"]
+
+
+async def get(path, query_string=b""):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": [],
+        "server": ("127.0.0.1", 8000),
+        "client": ("127.0.0.1", 50000),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def throughput(mode, path, query_string, seconds):
+    BaseConfig.METRICS = mode
+    # The engines are instrumented when they are created, according to the mode
+    await dispose_async_engine()
+    await get(path, query_string)
+    requests = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        await get(path, query_string)
+        requests += 1
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1, help="duration of each measurement")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    order_id = seed(100)
+    for name, path, query_string in [
+        ("GET /orders?limit=10", "/orders", b"limit=10"),
+        ("GET /orders/{order_id}", f"/orders/{order_id}", b""),
+    ]:
+        results = dict.fromkeys(MODES, 0.0)
+        for _ in range(args.rounds):
+            for mode in MODES:
+                results[mode] = max(results[mode], asyncio.run(throughput(mode, path, query_string, args.seconds)))
+        print(name)
+        for mode in MODES:
+            cost = (1 / results[mode] - 1 / results["off"]) * 1e6
+            print(f"  {mode:5} {results[mode]:8.1f} req/s  {cost:+7.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+""" Query plans and timings of the hot order queries before and after the index migration
+
+Seeds a scratch SQLite database at the revision before the indexes, measures, upgrades
+it to head and measures again:
+
+    python benchmarks/order_indexes.py --orders 1000000
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BEFORE_REVISION = "5aed6528161a"
+
+STATUSES = ["created", "paid", "scheduled", "progress", "cancelled", "dispatched", "delivered"]
+PRODUCTS = ["capuccino", "latte", "mocha", "espresso", "tea"]
+SIZES = ["small", "medium", "big"]
+
+QUERIES = {
+    "list orders": (
+        'SELECT id, status, created FROM "order" WHERE user_id = :user_id AND status != \'cancelled\' '
+        "ORDER BY created DESC, id DESC LIMIT 50"
+    ),
+    "list cancelled orders": (
+        'SELECT id, status, created FROM "order" WHERE user_id = :user_id AND status = \'cancelled\' '
+        "ORDER BY created DESC, id DESC LIMIT 50"
+    ),
+    "get order": 'SELECT * FROM "order" WHERE id = :order_id AND user_id = :user_id',
+    "load items": "SELECT order_id, product, size, quantity FROM order_item WHERE order_id = :order_id",
+}
+
+
+def alembic_config(database_path):
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    config.set_main_option("sqlalchemy.url", f"sqlite:///{database_path}")
+    return config
+
+
+def seed(connection, orders, users, batch_size=50_000):
+    """ Insert the orders with one or two items each, in batches """
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    start = datetime(2024, 1, 1)
+    samples = []
+    for offset in range(0, orders, batch_size):
+        order_rows, item_rows = [], []
+        for index in range(offset, min(offset + batch_size, orders)):
+            order_id = str(uuid.uuid4())
+            user_id = random.choice(user_ids)
+            created = start + timedelta(seconds=index * 30)
+            order_rows.append((order_id, user_id, random.choice(STATUSES), created.isoformat(" ")))
+            for _ in range(random.randint(1, 2)):
+                item_rows.append(
+                    (str(uuid.uuid4()), order_id, random.choice(PRODUCTS), random.choice(SIZES), "1")
+                )
+            if len(samples) < 200:
+                samples.append({"order_id": order_id, "user_id": user_id})
+        connection.executemany(
+            'INSERT INTO "order" (id, user_id, status, created) VALUES (?, ?, ?, ?)', order_rows
+        )
+        connection.executemany(
+            "INSERT INTO order_item (id, order_id, product, size, quantity) VALUES (?, ?, ?, ?, ?)",
+            item_rows,
+        )
+        connection.commit()
+    return samples
+
+
+def measure(connection, samples, repeat):
+    """ Print the query plan and the median and p95 timings of every hot query """
+    for name, query in QUERIES.items():
+        plan = connection.execute(f"EXPLAIN QUERY PLAN {query}", samples[0]).fetchall()
+        timings = []
+        for index in range(repeat):
+            parameters = samples[index % len(samples)]
+            start = time.perf_counter()
+            connection.execute(query, parameters).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"  {name}:")
+        for row in plan:
+            print(f"    plan: {row[-1]}")
+        print(
+            f"    median {statistics.median(timings):.3f} ms, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.3f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--database", help="scratch database path, defaults to a temporary file")
+    args = parser.parse_args()
+
+    database_path = args.database or str(Path(tempfile.mkdtemp()) / "orders_benchmark.db")
+    config = alembic_config(database_path)
+
+    command.upgrade(config, BEFORE_REVISION)
+    connection = sqlite3.connect(database_path)
+    print(f"Seeding {args.orders} orders into {database_path}")
+    samples = seed(connection, args.orders, args.users)
+    connection.execute("ANALYZE")
+
+    print(f"Before ({BEFORE_REVISION}):")
+    measure(connection, samples, args.repeat)
+    connection.close()
+
+    start = time.perf_counter()
+    command.upgrade(config, "head")
+    print(f"Migration to head took {time.perf_counter() - start:.1f} s")
+
+    connection = sqlite3.connect(database_path)
+    connection.execute("ANALYZE")
+    print("After (head):")
+    measure(connection, samples, args.repeat)
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+""" Throughput of GET /orders with the default and the fast (orjson) response paths
+
+Seeds a scratch SQLite database with orders of a single user, then drives the orders app
+with direct ASGI calls, listing 10, 100 and 1000 orders per request with
+ORDERS_FAST_RESPONSES off and on:
+
+    python benchmarks/orders_responses.py --seconds 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DATABASE = Path(tempfile.mkdtemp()) / "orders.db"
+# The engines are created from the configuration, which is read when the app is imported
+os.environ["ORDERS_DATABASE_URL"] = f"sqlite:///{DATABASE}"
+os.environ["ORDERS_ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{DATABASE}"
+os.environ["AUTH_ON"] = "False"
+
+from orders.config import BaseConfig  # noqa: E402
+from orders.repository import models  # noqa: E402
+from orders.repository.orders_repository import _bulk_rows  # noqa: E402
+from orders.web.app import app  # noqa: E402
+
+SIZES = [10, 100, 1000]
+
+
+def seed(orders):
+    engine = create_engine(os.environ["ORDERS_DATABASE_URL"])
+    models.Base.metadata.create_all(engine)
+    items = [{"product": "latte", "size": "big", "quantity": 1}, {"product": "tea", "size": "small", "quantity": 2}]
+    # The middleware sets the user to test when authorization is off
+    order_rows, item_rows, _ = _bulk_rows([items] * orders, "test")
+    with engine.begin() as connection:
+        connection.execute(insert(models.OrderModel), order_rows)
+        connection.execute(insert(models.OrderItemModel), item_rows)
+    engine.dispose()
+
+
+async def get(path, query_string):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": [],
+        "server": ("127.0.0.1", 8000),
+        "client": ("127.0.0.1", 50000),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def throughput(limit, seconds):
+    query_string = f"limit={limit}".encode()
+    # Warm up the pool and the route
+    body = await get("/orders", query_string)
+    requests = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        await get("/orders", query_string)
+        requests += 1
+    return requests / (time.perf_counter() - start), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3, help="duration of each measurement")
+    args = parser.parse_args()
+
+    seed(max(SIZES))
+    for limit in SIZES:
+        results = {}
+        for fast in (False, True):
+            BaseConfig.FAST_RESPONSES = fast
+            results[fast] = asyncio.run(throughput(limit, args.seconds))
+        (default, default_body), (fast, fast_body) = results[False], results[True]
+        # Both paths must return the same orders, the order of the keys aside
+        assert json.loads(default_body) == json.loads(fast_body), "the response bodies differ"
+        print(
+            f"{limit:5} orders  default {default:8.1f} req/s  fast {fast:8.1f} req/s  "
+            f"({fast / default:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+""" Throughput of concurrent writes and reads on SQLite with each connection profile
+
+Starts the orders app under uvicorn with several workers on a fresh SQLite database, then
+drives it from several client processes, each sending a mix of POST /orders and
+GET /orders?limit=20 for a fixed time. This runs with the default SQLite settings, with the
+tuned profile (WAL, synchronous=NORMAL, larger page cache, mmap, busy timeout) and with the
+tuned profile plus the read-only pool:
+
+    python benchmarks/sqlite_profile.py --workers 4 --clients 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from orders.repository import models  # noqa: E402
+
+PROFILES = {
+    "default": {"ORDERS_SQLITE_PROFILE": "default"},
+    "tuned": {"ORDERS_SQLITE_PROFILE": "tuned"},
+    "tuned + read pool": {"ORDERS_SQLITE_PROFILE": "tuned", "ORDERS_DB_READ_POOL": "True"},
+}
+ORDER = {"order": [{"product": "latte", "size": "big", "quantity": 1}]}
+
+
+def start_server(database, port, workers, profile):
+    env = dict(
+        os.environ,
+        ORDERS_DATABASE_URL=f"sqlite:///{database}",
+        ORDERS_ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{database}",
+        AUTH_ON="False",
+        WEB_CONCURRENCY=str(workers),
+        **PROFILES[profile],
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "orders.web.app:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/openapi/orders.json", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("The orders app did not start")
+
+
+def client(port, seconds, write_ratio, seed, results):
+    random.seed(seed)
+    counts = {"write": 0, "read": 0, "errors": 0}
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as http:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            if random.random() < write_ratio:
+                response, kind = http.post("/orders", json=ORDER), "write"
+            else:
+                response, kind = http.get("/orders", params={"limit": 20}), "read"
+            counts[kind if response.is_success else "errors"] += 1
+    results.put(counts)
+
+
+def run(profile, args):
+    database = Path(tempfile.mkdtemp()) / "orders.db"
+    engine = create_engine(f"sqlite:///{database}")
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+
+    server = start_server(database, args.port, args.workers, profile)
+    try:
+        results = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(target=client, args=(args.port, args.seconds, args.write_ratio, seed, results))
+            for seed in range(args.clients)
+        ]
+        for process in clients:
+            process.start()
+        totals = {"write": 0, "read": 0, "errors": 0}
+        for _ in clients:
+            for kind, count in results.get().items():
+                totals[kind] += count
+        for process in clients:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--clients", type=int, default=8, help="client processes")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each run")
+    parser.add_argument("--write-ratio", type=float, default=0.3, help="share of POST /orders in the mix")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.clients} clients, {args.write_ratio:.0%} writes, {args.seconds:g}s per run")
+    for profile in PROFILES:
+        totals = run(profile, args)
+        print(
+            f"{profile:18} writes {totals['write'] / args.seconds:8.1f}/s  "
+            f"reads {totals['read'] / args.seconds:8.1f}/s  errors {totals['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
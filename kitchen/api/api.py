@@ -1,6 +1,9 @@
+import base64
+import binascii
+import json
+import random
 import uuid
-import copy
-from datetime import datetime
+from datetime import datetime, timezone
 
 from flask import abort
 from flask.views import MethodView
@@ -8,29 +11,80 @@ from flask_smorest import Blueprint
 from marshmallow import ValidationError
 
 from api import schemas
+from api.store import ScheduleStore
+from config import BaseConfig
+from repository.durable_store import DurableScheduleStore
 
 
 blueprint = Blueprint("kitchen", __name__, description="Kitchen API")
 
 
-schedules = [
-    {
-        "id": str(uuid.uuid4()),
-        "scheduled": datetime.now(),
-        "status": "pending",
-        "order": [{"product": "capuccino", "quantity": 1, "size": "big"}],
-    }
-]
+if BaseConfig.SCHEDULES_BACKEND == "sqlite":
+    # Persisted schedules, loaded from the database on startup
+    schedules = DurableScheduleStore()
+else:
+    schedules = ScheduleStore([
+        {
+            "id": str(uuid.uuid4()),
+            "scheduled": datetime.utcnow(),
+            "status": "pending",
+            "order": [{"product": "capuccino", "quantity": 1, "size": "big"}],
+        }
+    ])
+
+
+# Schema instances are built once and reused for every response
+schedule_schema = schemas.GetScheduledOrderSchema()
+schedules_schema = schemas.GetScheduledOrderSchema(many=True)
+
+
+def should_validate():
+    """ Whether this response is validated, according to the RESPONSE_VALIDATION mode """
+    if BaseConfig.RESPONSE_VALIDATION == "strict":
+        return True
+    if BaseConfig.RESPONSE_VALIDATION == "sampled":
+        return random.random() * 100 < BaseConfig.RESPONSE_VALIDATION_SAMPLE_RATE
+    return False
+
+
+def as_input(schedule):
+    # A shallow copy is enough, only the scheduled date is replaced by its string form
+    return {**schedule, "scheduled": schedule["scheduled"].isoformat()}
 
 
 def validate_schedule(schedule):  # Validation of the response
-    schedule = copy.deepcopy(schedule)
-    schedule["scheduled"] = schedule["scheduled"].isoformat()
-    errors = schemas.GetScheduledOrderSchema().validate(schedule)
+    if not should_validate():
+        return
+    errors = schedule_schema.validate(as_input(schedule))
     if errors:
         raise ValidationError(errors)
 
 
+def validate_schedules(schedules):
+    """ Validate a list of schedules in a single pass """
+    if not should_validate():
+        return
+    errors = schedules_schema.validate([as_input(schedule) for schedule in schedules])
+    if errors:
+        raise ValidationError(errors)
+
+
+def encode_cursor(schedule):
+    """ Encode the (scheduled, id) key of the last schedule of a page into an opaque cursor """
+    key = json.dumps([schedule["scheduled"].isoformat(), schedule["id"]]).encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """ Decode a cursor back into the (scheduled, id) key it was built from """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        scheduled, schedule_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(scheduled), str(schedule_id)
+    except (binascii.Error, ValueError, TypeError):
+        abort(400, description=f"Invalid cursor {cursor}")
+
+
 @blueprint.route("/kitchen/schedules")
 class KitchenSchedules(MethodView):
 
@@ -39,36 +93,27 @@ class KitchenSchedules(MethodView):
     def get(self, parameters):
 
         if not parameters:
-            return {"schedules": schedules}
-
-        query_set = [schedule for schedule in schedules]
-
-        in_progress = parameters.get(progress)
-        if in_progress is not None:
-            if in_progress:
-                query_set = [
-                    schedule
-                    for schedule in schedules
-                    if schedule["status"] == "progress"
-                ]
-        else:
-            query_set = [
-                schedule for schedule in schedules if schedule["status"] != progress
-            ]
+            return {"schedules": schedules.list()[0], "next_cursor": None}
 
+        cursor = parameters.get("cursor")
+        in_progress = parameters.get("progress")
         since = parameters.get("since")
-        if since is not None:
-            query_set = [
-                schedule for schedule in schedules if schedule["scheduled"] >= since
-            ]
-
-        limit = parameters.get("limit")
-        if limit is not None and len(query_set) > limit:
-            query_set = query_set[:limit]
-
-        validate_schedule(query_set)
-
-        return {"schedules": query_set}
+        if since is not None and since.tzinfo is not None:
+            # Schedule dates are stored as naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        query_set, has_more = schedules.list(
+            # The progress filter seeks into the status index, its negation skips progress schedules
+            status="progress" if in_progress else None,
+            exclude_status="progress" if in_progress is False else None,
+            since=since,
+            after=decode_cursor(cursor) if cursor is not None else None,
+            limit=parameters.get("limit"),
+        )
+
+        validate_schedules(query_set)
+
+        next_cursor = encode_cursor(query_set[-1]) if has_more else None
+        return {"schedules": query_set, "next_cursor": next_cursor}
 
     @blueprint.arguments(schemas.ScheduleOrderSchema)
     @blueprint.response(status_code=201, schema=schemas.GetScheduledOrderSchema)
@@ -76,63 +121,88 @@ class KitchenSchedules(MethodView):
         payload["id"] = str(uuid.uuid4())
         payload["scheduled"] = datetime.utcnow()
         payload["status"] = "pending"
-        schedules.append(payload)
+        schedules.add(payload)
         validate_schedule(payload)
 
         return payload
 
 
+@blueprint.route("/kitchen/schedules:batch", methods=["POST"])
+@blueprint.arguments(schemas.ScheduleOrdersBatchSchema)
+@blueprint.response(status_code=201, schema=schemas.GetScheduledOrdersSchema)
+def schedule_orders_batch(payload):
+    # Schedules are returned in the order of the request, so callers can match them by position
+    scheduled = datetime.utcnow()
+    batch = [
+        {**schedule, "id": str(uuid.uuid4()), "scheduled": scheduled, "status": "pending"}
+        for schedule in payload["schedules"]
+    ]
+    schedules.add_many(batch)
+    validate_schedules(batch)
+
+    return {"schedules": batch}
+
+
+def set_schedule_etag(schedule_id):
+    """ Set the ETag of a schedule from its version, answering 304 if the client holds it already """
+    version = schedules.version(schedule_id)
+    if version is None:
+        abort(404, description=f"Resource with ID {schedule_id} not found")
+    # The ETag is computed from the version alone, the schedule is not serialized to check it
+    blueprint.set_etag([schedule_id, *version])
+
+
 @blueprint.route("/kitchen/schedules/<schedule_id>")
 class KitchenSchedule(MethodView):
 
+    @blueprint.etag
     @blueprint.response(status_code=200, schema=schemas.GetScheduledOrderSchema)
     def get(self, schedule_id):
-        for schedule in schedules:
-            if schedule["id"] == schedule_id:
-                validate_schedule(schedule)
-                return schedule
+        set_schedule_etag(schedule_id)
+        schedule = schedules.get(schedule_id)
+        if schedule is not None:
+            validate_schedule(schedule)
+            return schedule
 
         abort(404, description=f"Resource with ID {schedule_id} not found")
 
     @blueprint.arguments(schemas.ScheduleOrderSchema)
     @blueprint.response(status_code=200, schema=schemas.GetScheduledOrderSchema)
     def put(self, payload, schedule_id):
-        for schedule in schedules:
-            if schedule["id"] == schedule_id:
-                schedule.update(payload)
-                validate_schedule(schedule)
-                return schedule
+        schedule = schedules.update(schedule_id, **payload)
+        if schedule is not None:
+            validate_schedule(schedule)
+            return schedule
 
         abort(404, description=f"Resource with ID {schedule_id} not found")
 
     @blueprint.response(status_code=204)
     def delete(self, schedule_id):
-        for index, schedule in enumerate(schedules):
-            if schedule["id"] == schedule_id:
-                schedules.pop(index)
-                return
+        if schedules.delete(schedule_id) is not None:
+            return
 
         abort(404, description=f"Resource with ID {schedule_id} not found")
 
 
-@blueprint.response(status_code=200, schema=schemas.GetScheduledOrderSchema)
 @blueprint.route("/kitchen/schedules/<schedule_id>/cancel", methods=["POST"])
+@blueprint.response(status_code=200, schema=schemas.GetScheduledOrderSchema)
 def cancel_schedule(schedule_id):
-    for schedule in schedules:
-        if schedule["id"] == schedule_id:
-            schedule["status"] == "cancelled"
-            validate_schedule(schedule)
-            return schedule
+    schedule = schedules.update(schedule_id, status="cancelled")
+    if schedule is not None:
+        validate_schedule(schedule)
+        return schedule
 
     abort(404, description=f"Resource with ID {schedule_id} not found")
 
 
-@blueprint.response(status_code=200, schema=schemas.ScheduleStatusSchema)
 @blueprint.route("/kitchen/schedules/<schedule_id>/status", methods=["GET"])
+@blueprint.etag
+@blueprint.response(status_code=200, schema=schemas.ScheduleStatusSchema)
 def get_schedule_status(schedule_id):
-    for schedule in schedules:
-        if schedule["id"] == schedule_id:
-            validate_schedule(schedule)
-            return {"status": schedule["status"]}
+    set_schedule_etag(schedule_id)
+    schedule = schedules.get(schedule_id)
+    if schedule is not None:
+        validate_schedule(schedule)
+        return {"status": schedule["status"]}
 
     abort(404, description=f"Resource with ID {schedule_id} not found")
@@ -1,5 +1,7 @@
 from marshmallow import Schema, fields, validate, EXCLUDE
 
+from config import BaseConfig
+
 
 class OrderItemSchema(Schema):
     class Meta:
@@ -21,6 +23,17 @@ class ScheduleOrderSchema(Schema):
     order = fields.List(fields.Nested(OrderItemSchema), required=True)
 
 
+class ScheduleOrdersBatchSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    schedules = fields.List(
+        fields.Nested(ScheduleOrderSchema),
+        required=True,
+        validate=validate.Length(min=1, max=BaseConfig.MAX_BATCH_SIZE),
+    )
+
+
 class GetScheduledOrderSchema(ScheduleOrderSchema):
     id = fields.UUID(required=True)
     scheduled = fields.DateTime(required=True)
@@ -35,6 +48,8 @@ class GetScheduledOrdersSchema(Schema):
         unknown = EXCLUDE
 
     schedules = fields.List(fields.Nested(GetScheduledOrderSchema), required=True)
+    # Opaque cursor to pass back to fetch the next page, null on the last page
+    next_cursor = fields.String(allow_none=True)
 
 
 class ScheduleStatusSchema(Schema):
@@ -52,5 +67,6 @@ class GetKitchenScheduleParameters(Schema):
         unknown = EXCLUDE
 
     progress = fields.Boolean()
-    limit = fields.Integer()
+    limit = fields.Integer(validate=validate.Range(min=1))
     since = fields.DateTime()
+    cursor = fields.String()
@@ -0,0 +1,130 @@
+import bisect
+import threading
+import uuid
+from collections import defaultdict
+
+
+def schedule_key(schedule):
+    # Schedules are sorted on this key, which is also the pagination key
+    return schedule["scheduled"], schedule["id"]
+
+
+class ScheduleStore:
+    """ In-memory schedules indexed by id, by status and by scheduled date
+
+    Lookups by id are O(1) and listings seek into sorted indexes with a binary search.
+    Mutations hold a lock, so the store can be shared by the threads of a Flask server.
+    Each schedule has an update counter, which the API uses as its ETag.
+    """
+
+    def __init__(self, schedules=()):
+        self._lock = threading.RLock()
+        self._by_id = {}
+        # Sorted (scheduled, id) keys of every schedule, and of the schedules of each status
+        self._keys = []
+        self._keys_by_status = defaultdict(list)
+        self._versions = {}
+        self.load(schedules)
+
+    def load(self, schedules):
+        """ Replace the content of the store, sorting the indexes once """
+        with self._lock:
+            self._by_id = {schedule["id"]: schedule for schedule in schedules}
+            self._keys = sorted(schedule_key(schedule) for schedule in self._by_id.values())
+            self._keys_by_status = defaultdict(list)
+            for key in self._keys:
+                self._keys_by_status[self._by_id[key[1]]["status"]].append(key)
+            # Counters restart on every load, the epoch keeps versions from before apart
+            self.epoch = uuid.uuid4().hex
+            self._versions = dict.fromkeys(self._by_id, 1)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add(self, schedule):
+        with self._lock:
+            self._insert(schedule)
+        return schedule
+
+    def add_many(self, schedules):
+        with self._lock:
+            for schedule in schedules:
+                self._insert(schedule)
+        return schedules
+
+    def get(self, schedule_id):
+        """ Return the schedule with the given id, or None """
+        return self._by_id.get(schedule_id)
+
+    def version(self, schedule_id):
+        """ Return the (epoch, update counter) of a schedule, or None if it does not exist """
+        version = self._versions.get(schedule_id)
+        if version is not None:
+            return self.epoch, version
+
+    def update(self, schedule_id, **changes):
+        """ Update a schedule in place and return it, or None if it does not exist """
+        with self._lock:
+            schedule = self._by_id.get(schedule_id)
+            if schedule is None:
+                return None
+            old_key, old_status = schedule_key(schedule), schedule["status"]
+            schedule.update(changes)
+            self._versions[schedule_id] += 1
+            new_key, new_status = schedule_key(schedule), schedule["status"]
+            if new_key != old_key:
+                self._remove_key(self._keys, old_key)
+                bisect.insort(self._keys, new_key)
+            if new_key != old_key or new_status != old_status:
+                self._remove_key(self._keys_by_status[old_status], old_key)
+                bisect.insort(self._keys_by_status[new_status], new_key)
+            return schedule
+
+    def delete(self, schedule_id):
+        """ Remove a schedule and return it, or None if it does not exist """
+        with self._lock:
+            schedule = self._by_id.pop(schedule_id, None)
+            if schedule is not None:
+                del self._versions[schedule_id]
+                key = schedule_key(schedule)
+                self._remove_key(self._keys, key)
+                self._remove_key(self._keys_by_status[schedule["status"]], key)
+            return schedule
+
+    def list(self, status=None, exclude_status=None, since=None, after=None, limit=None):
+        """ Return a page of schedules sorted by (scheduled, id) and whether more follow
+
+        after is the (scheduled, id) key of the last schedule of the previous page.
+        """
+        with self._lock:
+            keys = self._keys if status is None else self._keys_by_status.get(status, [])
+            start = 0
+            if after is not None:
+                start = bisect.bisect_right(keys, after)
+            if since is not None:
+                # (since,) sorts before every key scheduled at or after since
+                start = max(start, bisect.bisect_left(keys, (since,)))
+
+            page = []
+            for index in range(start, len(keys)):
+                schedule = self._by_id[keys[index][1]]
+                if exclude_status is not None and schedule["status"] == exclude_status:
+                    continue
+                if limit is not None and len(page) == limit:
+                    return page, True
+                page.append(schedule)
+            return page, False
+
+    def _insert(self, schedule):
+        # Callers hold the lock
+        key = schedule_key(schedule)
+        self._by_id[schedule["id"]] = schedule
+        self._versions[schedule["id"]] = 1
+        bisect.insort(self._keys, key)
+        bisect.insort(self._keys_by_status[schedule["status"]], key)
+
+    @staticmethod
+    def _remove_key(keys, key):
+        index = bisect.bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            del keys[index]
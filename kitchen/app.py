@@ -1,3 +1,10 @@
+""" Kitchen API
+
+Run from the kitchen directory with the root of the repository on the import path, where
+the observability package shared with the orders service lives:
+
+    PYTHONPATH=.. flask run --port 3000
+"""
 from pathlib import Path
 
 import yaml
@@ -5,6 +12,8 @@ from apispec import APISpec
 from flask import Flask
 from flask_smorest import Api
 
+import metrics
+import profiling
 from api.api import blueprint
 from config import BaseConfig
 
@@ -16,7 +25,10 @@ kitchen_api = Api(app)
 
 kitchen_api.register_blueprint(blueprint)
 
-api_spec = yaml.safe_load((Path(__file__).parent / "oas.yaml").read_text())
+metrics.init_app(app)
+profiling.init_app(app)
+
+api_spec = yaml.safe_load((Path(__file__).parent / "../kitchen.yaml").read_text())
 
 spec = (
     APISpec(title=api_spec["info"]["title"], version=api_spec["info"]["version"],
@@ -1,3 +1,6 @@
+import os
+
+
 class BaseConfig:
     API_TITLE = "Kitchen API"
     API_VERSION = "v1"
@@ -12,3 +15,38 @@ class BaseConfig:
     OPENAPI_SWAGGER_UI_URL = "https://cdn.jsdelivr.net/npm/swagger-ui-dist@3.25.x/"
     OPENAPI_RAPIDOC_PATH = "/rapidoc"
     OPENAPI_RAPIDOC_URL = "https://unpkg.com/rapidoc/dist/rapidoc-min.js"
+
+    # "memory" keeps schedules in process, "sqlite" persists them in a WAL-mode database
+    SCHEDULES_BACKEND = os.getenv("KITCHEN_SCHEDULES_BACKEND", "memory")
+    DATABASE_URL = os.getenv("KITCHEN_DATABASE_URL", "sqlite:///kitchen.db")
+    # FULL also protects the latest commits against power loss, at the cost of an fsync per commit
+    SQLITE_SYNCHRONOUS = os.getenv("KITCHEN_SQLITE_SYNCHRONOUS", "NORMAL")
+    # Writes waiting for the database are committed together, up to this many per transaction
+    GROUP_COMMIT_MAX_BATCH = int(os.getenv("KITCHEN_GROUP_COMMIT_MAX_BATCH", "256"))
+    # Seconds the writer waits for more writes before committing, 0 commits as soon as it is free
+    GROUP_COMMIT_MAX_DELAY = float(os.getenv("KITCHEN_GROUP_COMMIT_MAX_DELAY", "0"))
+
+    # Validation of responses against their schema: "strict" validates every response,
+    # "sampled" validates RESPONSE_VALIDATION_SAMPLE_RATE percent of them and "off" none
+    RESPONSE_VALIDATION = os.getenv("KITCHEN_RESPONSE_VALIDATION", "strict")
+    RESPONSE_VALIDATION_SAMPLE_RATE = float(os.getenv("KITCHEN_RESPONSE_VALIDATION_SAMPLE_RATE", "1"))
+
+    # Metrics served on /metrics: "full" times every request and database query, "basic" only
+    # times requests, for a lower cost per request, and "off" collects none
+    METRICS = os.getenv("KITCHEN_METRICS", "full")
+
+    # Profiling of live requests: "cprofile" dumps pstats, "sampler" samples the stack every
+    # PROFILING_SAMPLER_INTERVAL seconds, for at most PROFILING_MAX_SECONDS, into collapsed
+    # stacks for flame graphs, "off" profiles nothing. PROFILING_SAMPLE_RATE percent of the
+    # requests are profiled, and every request carrying PROFILING_TOKEN in its X-Profile-Token
+    # header. The token also guards the /admin/profiles endpoints, disabled without one
+    PROFILING = os.getenv("KITCHEN_PROFILING", "off")
+    PROFILING_SAMPLE_RATE = float(os.getenv("KITCHEN_PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_TOKEN = os.getenv("KITCHEN_PROFILING_TOKEN")
+    PROFILING_DIR = os.getenv("KITCHEN_PROFILING_DIR", "profiles")
+    PROFILING_MAX_FILES = int(os.getenv("KITCHEN_PROFILING_MAX_FILES", "100"))
+    PROFILING_MAX_SECONDS = float(os.getenv("KITCHEN_PROFILING_MAX_SECONDS", "30"))
+    PROFILING_SAMPLER_INTERVAL = float(os.getenv("KITCHEN_PROFILING_SAMPLER_INTERVAL", "0.005"))
+
+    # Largest number of orders accepted by POST /kitchen/schedules:batch
+    MAX_BATCH_SIZE = int(os.getenv("KITCHEN_MAX_BATCH_SIZE", "500"))
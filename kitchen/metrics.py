@@ -0,0 +1,79 @@
+import time
+
+from flask import Response, g, request
+
+from config import BaseConfig
+from observability import metrics as shared
+from observability.metrics import (
+    CONTENT_TYPE, COUNT_BUCKETS, QUERY_BUCKETS, Gauge, Histogram, Registry, RequestMetrics, current_request,
+)
+
+registry = Registry()
+
+http_requests = registry.register(Histogram(
+    "kitchen_http_request_duration_seconds", "Time to handle a request", ("method", "route", "status"),
+))
+http_in_flight = registry.register(Gauge("kitchen_http_requests_in_flight", "Requests being handled"))
+db_queries = registry.register(Histogram(
+    "kitchen_db_query_duration_seconds", "Time to run a database query", buckets=QUERY_BUCKETS,
+))
+db_queries_per_request = registry.register(Histogram(
+    "kitchen_db_queries_per_request", "Database queries made by a request", ("method", "route"), buckets=COUNT_BUCKETS,
+))
+db_seconds_per_request = registry.register(Histogram(
+    "kitchen_db_seconds_per_request", "Time spent in database queries by a request", ("method", "route"),
+))
+# The writes of the sqlite backend run on the group commit thread, outside of the requests,
+# so they are timed per commit instead of per request
+db_group_commits = registry.register(Histogram(
+    "kitchen_db_group_commit_duration_seconds", "Time to apply and commit a batch of queued writes",
+))
+db_group_commit_writes = registry.register(Histogram(
+    "kitchen_db_group_commit_writes", "Queued writes committed together", buckets=COUNT_BUCKETS,
+))
+
+
+def full():
+    """ Whether the database queries are timed, on top of the requests """
+    return BaseConfig.METRICS == "full"
+
+
+def instrument_engine(engine):
+    """ Time every query of an engine """
+    shared.instrument_engine(engine, db_queries)
+
+
+def init_app(app):
+    """ Time the requests of the app and serve the metrics on /metrics """
+    if BaseConfig.METRICS == "off":
+        return
+
+    @app.before_request
+    def start_request():
+        http_in_flight.inc()
+        g.metrics_token = current_request.set(RequestMetrics() if full() else None)
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def end_request(exception):
+        if "metrics_start" not in g:
+            return
+        seconds = time.perf_counter() - g.metrics_start
+        http_in_flight.dec()
+        request_metrics = current_request.get()
+        current_request.reset(g.metrics_token)
+        # Unmatched paths share one label, so that they cannot blow up the number of series
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        http_requests.observe(seconds, request.method, route, str(g.get("metrics_status", 500)))
+        if request_metrics is not None:
+            db_queries_per_request.observe(request_metrics.queries, request.method, route)
+            db_seconds_per_request.observe(request_metrics.query_seconds, request.method, route)
+
+    @app.get("/metrics")
+    def get_metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
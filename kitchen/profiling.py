@@ -0,0 +1,76 @@
+import threading
+
+from flask import abort, g, jsonify, request, send_file
+
+from config import BaseConfig
+from observability.profiling import ID_HEADER, PROFILERS, TOKEN_HEADER, ProfileStore, token_matches, wants_profile
+
+profile_store = ProfileStore(BaseConfig.PROFILING_DIR, BaseConfig.PROFILING_MAX_FILES)
+
+# Held while a request is profiled, so that a single request is profiled at a time
+_busy = threading.Lock()
+
+
+def is_admin(token):
+    """ Whether a token is the admin token of the profiling, which is off without one """
+    return token_matches(token, BaseConfig.PROFILING_TOKEN)
+
+
+def _authorize():
+    if not BaseConfig.PROFILING_TOKEN:
+        abort(404, description="Profiling is disabled")
+    if not is_admin(request.headers.get(TOKEN_HEADER)):
+        abort(403, description="Invalid profiling token")
+
+
+def init_app(app):
+    """ Profile a sample of the requests, and the requests of an admin, and serve the profiles
+
+    A request is profiled when it carries the admin token in the X-Profile-Token header, or
+    with a probability of PROFILING_SAMPLE_RATE percent. One request is profiled at a time.
+    Requests of an admin get the name of their profile in the X-Profile-Id header, sampled
+    requests are profiled without telling the client.
+    """
+    if BaseConfig.PROFILING == "off":
+        return
+
+    @app.before_request
+    def start_profile():
+        token = request.headers.get(TOKEN_HEADER)
+        wanted = wants_profile(request.path, token, BaseConfig.PROFILING_TOKEN, BaseConfig.PROFILING_SAMPLE_RATE)
+        if not wanted or not _busy.acquire(blocking=False):
+            return
+        profiler = PROFILERS[BaseConfig.PROFILING]
+        g.profile = profiler(threading.get_ident(), BaseConfig.PROFILING_MAX_SECONDS, BaseConfig.PROFILING_SAMPLER_INTERVAL)
+        g.profile_name = profile_store.new_name(request.method, request.path, profiler.extension)
+        g.profile.start()
+
+    @app.after_request
+    def add_profile_id(response):
+        if "profile" in g and is_admin(request.headers.get(TOKEN_HEADER)):
+            response.headers[ID_HEADER] = g.profile_name
+        return response
+
+    @app.teardown_request
+    def save_profile(exception):
+        session = g.pop("profile", None)
+        if session is None:
+            return
+        try:
+            session.stop()
+            profile_store.save(session, g.profile_name)
+        finally:
+            _busy.release()
+
+    @app.get("/admin/profiles")
+    def list_profiles():
+        _authorize()
+        return jsonify({"profiles": profile_store.list()})
+
+    @app.get("/admin/profiles/<name>")
+    def get_profile(name):
+        _authorize()
+        path = profile_store.path(name)
+        if path is None:
+            abort(404, description=f"Profile {name} not found")
+        return send_file(path.resolve(), mimetype="application/octet-stream", as_attachment=True, download_name=name)
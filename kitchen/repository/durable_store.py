@@ -0,0 +1,142 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+from api.store import ScheduleStore
+from config import BaseConfig
+from repository.schedules_repository import SchedulesRepository
+from repository.unit_of_work import UnitOfWork
+
+
+class GroupCommitWriter:
+    """ Background thread that applies queued writes and commits them in shared transactions
+
+    Writes queued while a commit is running are committed together in the next one,
+    so concurrent requests share the cost of a commit.
+    """
+
+    def __init__(self, max_batch=None, max_delay=None):
+        self.max_batch = max_batch or BaseConfig.GROUP_COMMIT_MAX_BATCH
+        self.max_delay = BaseConfig.GROUP_COMMIT_MAX_DELAY if max_delay is None else max_delay
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="kitchen-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation, *args, **kwargs):
+        """ Queue a SchedulesRepository call, the returned future resolves once it is committed """
+        future = Future()
+        self._queue.put((operation, args, kwargs, future))
+        return future
+
+    def close(self):
+        """ Commit the queued writes and stop the writer thread """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            write = self._queue.get()
+            if write is None:
+                return
+            batch = [write]
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    if self.max_delay:
+                        write = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    else:
+                        write = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if write is None:
+                    stop = True
+                    break
+                batch.append(write)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        try:
+            with UnitOfWork() as unit_of_work:
+                repository = SchedulesRepository(unit_of_work.session)
+                for operation, args, kwargs, _ in batch:
+                    getattr(repository, operation)(*args, **kwargs)
+                unit_of_work.commit()
+            if metrics.full():
+                metrics.db_group_commits.observe(time.perf_counter() - start)
+                metrics.db_group_commit_writes.observe(len(batch))
+        except Exception as error:
+            for *_, future in batch:
+                future.set_exception(error)
+        else:
+            for *_, future in batch:
+                future.set_result(None)
+
+
+class DurableScheduleStore(ScheduleStore):
+    """ ScheduleStore persisted to SQLite, with the in-memory indexes as read cache
+
+    Schedules are bulk loaded on startup. Reads are served from memory, and each write
+    returns once the group commit that includes it has completed.
+    """
+
+    def __init__(self, writer=None):
+        super().__init__()
+        self.writer = writer or GroupCommitWriter()
+        atexit.register(self.writer.close)
+        self.reload()
+
+    def reload(self):
+        """ Rebuild the in-memory indexes from the database """
+        with UnitOfWork() as unit_of_work:
+            self.load(SchedulesRepository(unit_of_work.session).list())
+
+    def add(self, schedule):
+        # Queue under the store lock, so writes reach the database in the order they reached memory
+        with self._lock:
+            self._insert(schedule)
+            future = self.writer.submit("add", dict(schedule))
+        self._wait(future)
+        return schedule
+
+    def add_many(self, schedules):
+        # The whole batch is written with one executemany in one group commit
+        with self._lock:
+            for schedule in schedules:
+                self._insert(schedule)
+            future = self.writer.submit("add_many", [dict(schedule) for schedule in schedules])
+        self._wait(future)
+        return schedules
+
+    def update(self, schedule_id, **changes):
+        with self._lock:
+            schedule = super().update(schedule_id, **changes)
+            if schedule is None:
+                return None
+            future = self.writer.submit("update", schedule_id, **changes)
+        self._wait(future)
+        return schedule
+
+    def delete(self, schedule_id):
+        with self._lock:
+            schedule = super().delete(schedule_id)
+            if schedule is None:
+                return None
+            future = self.writer.submit("delete", schedule_id)
+        self._wait(future)
+        return schedule
+
+    def _wait(self, future):
+        try:
+            future.result()
+        except Exception:
+            # The cache is ahead of the database, bring it back in line before failing the request
+            self.reload()
+            raise
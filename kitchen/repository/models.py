@@ -0,0 +1,25 @@
+from sqlalchemy import JSON, Column, DateTime, Index, String
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
+
+
+class ScheduleModel(Base):
+    __tablename__ = 'schedule'
+    __table_args__ = (
+        Index('ix_schedule_scheduled_id', 'scheduled', 'id'),
+    )
+
+    id = Column(String, primary_key=True)
+    scheduled = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False)
+    # The ordered items, kept as they were posted
+    order = Column(JSON, nullable=False)
+
+    def dict(self):
+        return {
+            'id': self.id,
+            'scheduled': self.scheduled,
+            'status': self.status,
+            'order': self.order,
+        }
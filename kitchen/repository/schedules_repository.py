@@ -0,0 +1,28 @@
+from sqlalchemy import delete, insert, select, update
+
+from repository.models import ScheduleModel
+
+
+class SchedulesRepository:
+    def __init__(self, session):
+        self.session = session
+
+    def add(self, schedule):
+        # Core statements skip the ORM unit-of-work bookkeeping on the write path
+        self.session.execute(insert(ScheduleModel).values(**schedule))
+
+    def add_many(self, schedules):
+        # One executemany for the whole batch
+        self.session.execute(insert(ScheduleModel), schedules)
+
+    def update(self, schedule_id, **changes):
+        # A single UPDATE statement, without loading the row first
+        self.session.execute(update(ScheduleModel).where(ScheduleModel.id == schedule_id).values(**changes))
+
+    def delete(self, schedule_id):
+        self.session.execute(delete(ScheduleModel).where(ScheduleModel.id == schedule_id))
+
+    def list(self):
+        """ Return every schedule as a dict, for the bulk load on startup """
+        records = self.session.execute(select(ScheduleModel)).scalars()
+        return [record.dict() for record in records]
@@ -0,0 +1,66 @@
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import metrics
+from config import BaseConfig
+from repository.models import Base
+
+
+# One engine and session factory per process, created on first use
+_engine = None
+_Session = None
+_lock = threading.Lock()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the writer. With NORMAL sync, commits survive a crash
+    # of the process and only the latest ones can be lost on power failure
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={BaseConfig.SQLITE_SYNCHRONOUS}")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def get_engine():
+    """ Return the process-wide engine, creating it and its tables on first use """
+    global _engine, _Session
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                engine = create_engine(BaseConfig.DATABASE_URL)
+                if engine.dialect.name == "sqlite":
+                    event.listen(engine, "connect", _set_sqlite_pragmas)
+                if metrics.full():
+                    metrics.instrument_engine(engine)
+                Base.metadata.create_all(engine)
+                _Session = sessionmaker(bind=engine)
+                _engine = engine
+    return _engine
+
+
+class UnitOfWork:
+
+    def __init__(self):
+        """ Initialize the session factory object """
+        self.engine = get_engine()
+        self.Session = _Session
+
+    def __enter__(self):
+        self.session = self.Session()
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback):
+        if exc_type is not None:
+            self.rollback()
+        self.session.close()
+
+    def commit(self):
+        """ Wrapper around SQLAlchemy's commit() method """
+        self.session.commit()
+
+    def rollback(self):
+        """ Wrapper around SQLAlchemy's rollback() method """
+        self.session.rollback()
@@ -1,3 +1,4 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -15,6 +16,12 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# ORDERS_DATABASE_URL, which the orders service reads too, takes precedence over alembic.ini.
+# Without it, the URL of alembic.ini or of the caller is kept, e.g. a scratch database
+from orders.config import BaseConfig
+if "ORDERS_DATABASE_URL" in os.environ or not config.get_main_option("sqlalchemy.url"):
+    config.set_main_option("sqlalchemy.url", BaseConfig.DATABASE_URL)
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 from orders.repository.models import Base
@@ -65,8 +72,12 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # SQLite cannot alter most constraints in place, batch operations recreate the table
+        # instead. Other databases, like PostgreSQL, run them as plain ALTER statements
         context.configure(
-            connection=connection, target_metadata=target_metadata, render_as_batch=True
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
@@ -28,9 +28,12 @@ def upgrade() -> None:
     sa.Column('delivery_id', sa.String(), nullable=True),
     sa.PrimaryKeyConstraint('id')
     )
+    # SQLite accepts the mismatched type of the foreign key, fixed by 63ec7c145d34, but
+    # PostgreSQL refuses to create it, so it is a string there from the start
+    order_id_type = sa.Integer() if op.get_context().dialect.name == 'sqlite' else sa.String()
     op.create_table('order_item',
     sa.Column('id', sa.String(), nullable=False),
-    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('order_id', order_id_type, nullable=True),
     sa.Column('product', sa.String(), nullable=False),
     sa.Column('size', sa.String(), nullable=False),
     sa.Column('quantity', sa.String(), nullable=False),
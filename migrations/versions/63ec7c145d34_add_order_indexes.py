@@ -0,0 +1,53 @@
+"""Add order indexes and make order_item.order_id a string
+
+Revision ID: 63ec7c145d34
+Revises: 5aed6528161a
+Create Date: 2026-10-18 13:02:11.402817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '63ec7c145d34'
+down_revision: Union[str, None] = '5aed6528161a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        # Serves GET /orders, which filters on user_id and pages on (created, id)
+        batch_op.create_index('ix_order_user_id_created_id', ['user_id', 'created', 'id'], unique=False)
+        # Serves the cancelled filter of GET /orders
+        batch_op.create_index('ix_order_user_id_status_created_id', ['user_id', 'status', 'created', 'id'], unique=False)
+
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        # order.id is a string UUID, so the foreign key must be a string too
+        batch_op.alter_column(
+            'order_id',
+            existing_type=sa.Integer(),
+            type_=sa.String(),
+            existing_nullable=True,
+            postgresql_using='order_id::varchar',
+        )
+        batch_op.create_index('ix_order_item_order_id', ['order_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_item_order_id')
+        batch_op.alter_column(
+            'order_id',
+            existing_type=sa.String(),
+            type_=sa.Integer(),
+            existing_nullable=True,
+            postgresql_using='order_id::integer',
+        )
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_user_id_status_created_id')
+        batch_op.drop_index('ix_order_user_id_created_id')
@@ -0,0 +1,44 @@
+"""Add outbox table
+
+Revision ID: 9b5e9d3e094e
+Revises: 63ec7c145d34
+Create Date: 2026-10-18 13:05:42.118240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b5e9d3e094e'
+down_revision: Union[str, None] = '63ec7c145d34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('order_id', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('claim_token', sa.String(), nullable=True),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('outbox', schema=None) as batch_op:
+        batch_op.create_index('ix_outbox_status_available_at', ['status', 'available_at'], unique=False)
+        batch_op.create_index('ix_outbox_claim_token', ['claim_token'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_outbox_claim_token')
+        batch_op.drop_index('ix_outbox_status_available_at')
+
+    op.drop_table('outbox')
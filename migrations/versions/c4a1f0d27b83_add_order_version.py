@@ -0,0 +1,29 @@
+"""Add order version
+
+Revision ID: c4a1f0d27b83
+Revises: 9b5e9d3e094e
+Create Date: 2026-10-18 13:12:09.532871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a1f0d27b83'
+down_revision: Union[str, None] = '9b5e9d3e094e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing orders start at version 1
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_column('version')
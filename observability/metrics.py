@@ -0,0 +1,161 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+# Prometheus default buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels, value):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"]
+
+
+class Gauge(_Metric):
+    """ Gauge set by the code, or read from a function when the metrics are rendered """
+
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        if self.function is not None:
+            # The function returns {label values: value}
+            with self._lock:
+                self._values = dict(self.function())
+        return super().render()
+
+
+class Histogram(_Metric):
+    """ Histogram with fixed buckets, counts are kept per bucket and made cumulative on render """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Counts per bucket plus the +Inf one, then the sum
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _samples(self, labels, value):
+        counts, total = value
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _number(bound) + '"'
+            samples.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+        samples.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+        samples.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return samples
+
+
+class Registry:
+    """ The metrics of the process, rendered in the Prometheus text format
+
+    Each process has its own registry, so every worker of a multi-process server is a
+    target of its own.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """ Database queries made while a request is handled, collected by the SQLAlchemy events """
+
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+# The metrics of the request being handled, None outside of requests, e.g. in background workers
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def instrument_engine(engine, queries):
+    """ Time every query of a sync engine into the queries histogram, and add it to the current request """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_start"].pop()
+        queries.observe(seconds)
+        request = current_request.get()
+        if request is not None:
+            request.queries += 1
+            request.query_seconds += seconds
@@ -0,0 +1,160 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+TOKEN_HEADER = "X-Profile-Token"
+ID_HEADER = "X-Profile-Id"
+
+_NAME = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+
+class CProfileSession:
+    """ Deterministic profile of the thread handling the request, dumped as pstats
+
+    On an event loop, the other requests running at the same time are profiled too.
+    """
+
+    extension = "pstats"
+
+    def __init__(self, thread_id, max_seconds, interval):
+        self.profile = cProfile.Profile()
+        self.deadline = time.monotonic() + max_seconds
+        self.running = False
+
+    def start(self):
+        self.profile.enable()
+        self.running = True
+
+    def stop(self):
+        # Must run in the thread that started the profile
+        if self.running:
+            self.profile.disable()
+            self.running = False
+
+    def check_deadline(self):
+        if time.monotonic() >= self.deadline:
+            self.stop()
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+
+class StackSampler:
+    """ Samples the stack of one thread from a background thread, dumped as collapsed stacks
+
+    The profiled thread only pays for holding the GIL while its stack is read, once per
+    interval, so it suits live workers. Reading the stack takes the GIL, so a busy thread is
+    sampled at most every sys.getswitchinterval(), 5 ms by default, and requests shorter than
+    that may have no samples. The output is the input of flamegraph.pl and speedscope.
+    """
+
+    extension = "collapsed"
+
+    def __init__(self, thread_id, max_seconds, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.deadline = time.monotonic() + max_seconds
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def check_deadline(self):
+        # The sampler thread stops by itself
+        pass
+
+    def _run(self):
+        while not self._stopped.wait(self.interval) and time.monotonic() < self.deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+PROFILERS = {"cprofile": CProfileSession, "sampler": StackSampler}
+
+
+class ProfileStore:
+    """ Directory of the latest profiles, the oldest ones are deleted past max_files """
+
+    def __init__(self, directory, max_files):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def new_name(self, method, path, extension):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:40] or "root"
+        return f"{datetime.utcnow():%Y%m%dT%H%M%S}-{method}-{slug}-{uuid.uuid4().hex[:8]}.{extension}"
+
+    def path(self, name):
+        """ Return the path of a stored profile, None if there is no such profile """
+        if not _NAME.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    def save(self, session, name):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        session.dump(self.directory / name)
+        for path in self._paths()[self.max_files:]:
+            path.unlink(missing_ok=True)
+
+    def list(self):
+        """ Return the stored profiles, newest first """
+        profiles = []
+        for path in self._paths():
+            stat = path.stat()
+            profiles.append({
+                "name": path.name,
+                "size": stat.st_size,
+                "created": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+            })
+        return profiles
+
+    def _paths(self):
+        if not self.directory.is_dir():
+            return []
+        paths = [path for path in self.directory.iterdir() if path.is_file() and _NAME.match(path.name)]
+        return sorted(paths, key=lambda path: path.stat().st_mtime, reverse=True)
+
+
+def token_matches(token, expected):
+    """ Whether a token is the expected one, no token matches when none is expected """
+    return bool(expected) and token is not None and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def wants_profile(path, token, expected_token, sample_rate):
+    """ Whether to profile a request, always with the expected token and else sampled, in percent
+
+    The requests of the profile endpoints are never profiled.
+    """
+    if path.startswith("/admin/profiles"):
+        return False
+    if token is not None:
+        return token_matches(token, expected_token)
+    return sample_rate > 0 and random.random() * 100 < sample_rate
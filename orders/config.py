@@ -0,0 +1,133 @@
+import os
+
+
+def async_database_url(url):
+    """ Return a database URL with the async driver of its backend, aiosqlite or asyncpg """
+    scheme, separator, rest = url.partition("://")
+    backend = scheme.split("+")[0]
+    if backend == "sqlite":
+        return f"sqlite+aiosqlite{separator}{rest}"
+    if backend in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{separator}{rest}"
+    return url
+
+
+class BaseConfig:
+    # Authorization of requests with a bearer token, off in local development
+    AUTH_ON = os.getenv("AUTH_ON", "False") == "True"
+    # Token of the operators, sent in the X-Admin-Token header to read the pool, cache and
+    # integration stats. Those endpoints are disabled without one
+    ADMIN_TOKEN = os.getenv("ORDERS_ADMIN_TOKEN")
+
+    # Database connection and pool settings, shared by every UnitOfWork in the process.
+    # SQLite and PostgreSQL are supported, e.g. postgresql://orders:secret@db/orders
+    DATABASE_URL = os.getenv("ORDERS_DATABASE_URL", "sqlite:///orders.db")
+    DB_POOL_SIZE = int(os.getenv("ORDERS_DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("ORDERS_DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("ORDERS_DB_POOL_TIMEOUT", "30"))
+    DB_POOL_PRE_PING = os.getenv("ORDERS_DB_POOL_PRE_PING", "True") == "True"
+    # -1 disables recycling of pooled connections
+    DB_POOL_RECYCLE = int(os.getenv("ORDERS_DB_POOL_RECYCLE", "-1"))
+    # The API runs on an AsyncSession, through the async driver of the same database by default
+    ASYNC_DATABASE_URL = os.getenv("ORDERS_ASYNC_DATABASE_URL", async_database_url(DATABASE_URL))
+    # Read replica of the database. When it is set, listing and getting orders read from it,
+    # while every write goes to the primary. Replica reads bypass the order cache, so that a
+    # lagging replica cannot pin a stale order in it, and an order missing from the replica
+    # is read again from the primary
+    REPLICA_DATABASE_URL = os.getenv("ORDERS_REPLICA_DATABASE_URL")
+    # Separate pool of read-only connections for the GET routes, so that reads never wait
+    # behind writers for a connection. On SQLite its connections run with query_only.
+    # It connects to the replica when there is one, and is always on in that case
+    DB_READ_POOL = os.getenv("ORDERS_DB_READ_POOL", "False") == "True" or REPLICA_DATABASE_URL is not None
+    DB_READ_POOL_SIZE = int(os.getenv("ORDERS_DB_READ_POOL_SIZE", "10"))
+    ASYNC_READ_DATABASE_URL = os.getenv(
+        "ORDERS_ASYNC_READ_DATABASE_URL",
+        async_database_url(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else ASYNC_DATABASE_URL,
+    )
+
+    # SQLite settings applied to every new connection by the tuned profile, the default
+    # profile leaves the SQLite defaults. Sizes are in bytes, or in KiB when negative
+    SQLITE_PROFILE = os.getenv("ORDERS_SQLITE_PROFILE", "tuned")
+    SQLITE_JOURNAL_MODE = os.getenv("ORDERS_SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("ORDERS_SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT = int(os.getenv("ORDERS_SQLITE_BUSY_TIMEOUT", "5000"))
+    SQLITE_CACHE_SIZE = int(os.getenv("ORDERS_SQLITE_CACHE_SIZE", "-65536"))
+    SQLITE_MMAP_SIZE = int(os.getenv("ORDERS_SQLITE_MMAP_SIZE", "268435456"))
+    SQLITE_TEMP_STORE = os.getenv("ORDERS_SQLITE_TEMP_STORE", "MEMORY")
+
+    # Metrics served on /metrics: "full" times every request, database query and downstream
+    # call, "basic" only times requests, for a lower cost per request, and "off" collects none
+    METRICS = os.getenv("ORDERS_METRICS", "full")
+
+    # Profiling of live requests: "cprofile" dumps pstats, "sampler" samples the stack every
+    # PROFILING_SAMPLER_INTERVAL seconds into collapsed stacks for flame graphs, "off" profiles
+    # nothing. PROFILING_SAMPLE_RATE percent of the requests are profiled, and every request
+    # carrying PROFILING_TOKEN in its X-Profile-Token header. The token also guards the
+    # /admin/profiles endpoints, which are disabled without one. It defaults to ADMIN_TOKEN
+    PROFILING = os.getenv("ORDERS_PROFILING", "off")
+    PROFILING_SAMPLE_RATE = float(os.getenv("ORDERS_PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_TOKEN = os.getenv("ORDERS_PROFILING_TOKEN", ADMIN_TOKEN)
+    PROFILING_DIR = os.getenv("ORDERS_PROFILING_DIR", "profiles")
+    PROFILING_MAX_FILES = int(os.getenv("ORDERS_PROFILING_MAX_FILES", "100"))
+    PROFILING_MAX_SECONDS = float(os.getenv("ORDERS_PROFILING_MAX_SECONDS", "30"))
+    PROFILING_SAMPLER_INTERVAL = float(os.getenv("ORDERS_PROFILING_SAMPLER_INTERVAL", "0.005"))
+
+    # Downstream services called by the orders service
+    KITCHEN_API_URL = os.getenv("KITCHEN_API_URL", "http://localhost:3000/kitchen")
+    PAYMENTS_API_URL = os.getenv("PAYMENTS_API_URL", "http://localhost:3001")
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("ORDERS_HTTP_CONNECT_TIMEOUT", "2"))
+    HTTP_READ_TIMEOUT = float(os.getenv("ORDERS_HTTP_READ_TIMEOUT", "5"))
+    HTTP_MAX_CONNECTIONS = int(os.getenv("ORDERS_HTTP_MAX_CONNECTIONS", "100"))
+    # Retries only apply to idempotent calls
+    HTTP_MAX_RETRIES = int(os.getenv("ORDERS_HTTP_MAX_RETRIES", "2"))
+    HTTP_RETRY_BACKOFF = float(os.getenv("ORDERS_HTTP_RETRY_BACKOFF", "0.1"))
+    # Consecutive failures before the circuit opens, and seconds before it lets a trial call through
+    HTTP_BREAKER_THRESHOLD = int(os.getenv("ORDERS_HTTP_BREAKER_THRESHOLD", "5"))
+    HTTP_BREAKER_RESET = float(os.getenv("ORDERS_HTTP_BREAKER_RESET", "30"))
+    # Paid orders are scheduled in batches of up to KITCHEN_BATCH_MAX_SIZE orders,
+    # waiting at most KITCHEN_BATCH_MAX_DELAY seconds for a batch to fill up
+    KITCHEN_BATCHING = os.getenv("ORDERS_KITCHEN_BATCHING", "True") == "True"
+    KITCHEN_BATCH_MAX_SIZE = int(os.getenv("ORDERS_KITCHEN_BATCH_MAX_SIZE", "50"))
+    KITCHEN_BATCH_MAX_DELAY = float(os.getenv("ORDERS_KITCHEN_BATCH_MAX_DELAY", "0.005"))
+
+    # Verified access tokens are cached for at most JWT_CACHE_TTL seconds, and never past their exp claim
+    JWT_CACHE_SIZE = int(os.getenv("ORDERS_JWT_CACHE_SIZE", "10000"))
+    JWT_CACHE_TTL = float(os.getenv("ORDERS_JWT_CACHE_TTL", "300"))
+
+    # Encode the responses of GET /orders and GET /orders/{order_id} with orjson, without validating
+    # them again against their response model. Requires the orjson package
+    FAST_RESPONSES = os.getenv("ORDERS_FAST_RESPONSES", "False") == "True"
+
+    # Orders fetched per round trip of the server-side cursor of GET /orders/export
+    EXPORT_BATCH_SIZE = int(os.getenv("ORDERS_EXPORT_BATCH_SIZE", "1000"))
+
+    # Largest number of orders accepted by POST /orders:batch
+    MAX_BATCH_SIZE = int(os.getenv("ORDERS_MAX_BATCH_SIZE", "500"))
+
+    # Background dispatch of the outbox: messages claimed per round, seconds between polls when idle,
+    # seconds a claimed message stays reserved, and attempts before a message is marked failed.
+    # Payments are retried with the same Idempotency-Key, which payments.yaml keeps for 24 hours,
+    # so every attempt of a message must fit in that window
+    OUTBOX_BATCH_SIZE = int(os.getenv("ORDERS_OUTBOX_BATCH_SIZE", "20"))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("ORDERS_OUTBOX_POLL_INTERVAL", "1"))
+    OUTBOX_LEASE = float(os.getenv("ORDERS_OUTBOX_LEASE", "60"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("ORDERS_OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_RETRY_BACKOFF = float(os.getenv("ORDERS_OUTBOX_RETRY_BACKOFF", "1"))
+
+    # Read-through cache of GET /orders/{order_id}: memory, redis or off. Entries expire after
+    # ORDER_CACHE_TTL seconds, writes to an order invalidate it right after they are committed.
+    # The memory cache is only invalidated by the writes of its own process, so with several
+    # workers each one would serve, and answer 304 for, orders changed by another one until
+    # the TTL. It is for single-process servers, and is turned off when WEB_CONCURRENCY, the
+    # worker count of uvicorn and gunicorn, is above 1. Multi-worker servers use redis
+    ORDER_CACHE_BACKEND = os.getenv("ORDERS_ORDER_CACHE_BACKEND", "off")
+    WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+    ORDER_CACHE_SIZE = int(os.getenv("ORDERS_ORDER_CACHE_SIZE", "10000"))
+    ORDER_CACHE_TTL = float(os.getenv("ORDERS_ORDER_CACHE_TTL", "30"))
+    REDIS_URL = os.getenv("ORDERS_REDIS_URL", "redis://localhost:6379/0")
+
+    # Order status streams: events buffered per subscriber, seconds between SSE keep-alive
+    # comments, and longest wait of a long-poll request
+    EVENTS_QUEUE_SIZE = int(os.getenv("ORDERS_EVENTS_QUEUE_SIZE", "16"))
+    EVENTS_HEARTBEAT = float(os.getenv("ORDERS_EVENTS_HEARTBEAT", "15"))
+    EVENTS_MAX_WAIT = float(os.getenv("ORDERS_EVENTS_MAX_WAIT", "30"))
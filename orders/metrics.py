@@ -0,0 +1,104 @@
+import time
+
+from observability import metrics as shared
+# CONTENT_TYPE is served by the /metrics route
+from observability.metrics import (  # noqa: F401
+    CONTENT_TYPE, COUNT_BUCKETS, QUERY_BUCKETS, Gauge, Histogram, Registry, RequestMetrics, current_request,
+)
+from orders.config import BaseConfig
+
+registry = Registry()
+
+http_requests = registry.register(Histogram(
+    "orders_http_request_duration_seconds",
+    "Time to handle a request, until its response is sent",
+    ("method", "route", "status"),
+))
+http_in_flight = registry.register(Gauge(
+    "orders_http_requests_in_flight", "Requests being handled",
+))
+auth_seconds = registry.register(Histogram(
+    "orders_auth_duration_seconds", "Time to validate the access token of a request", buckets=QUERY_BUCKETS,
+))
+db_queries = registry.register(Histogram(
+    "orders_db_query_duration_seconds", "Time to run a database query", buckets=QUERY_BUCKETS,
+))
+db_queries_per_request = registry.register(Histogram(
+    "orders_db_queries_per_request", "Database queries made by a request", ("method", "route"), buckets=COUNT_BUCKETS,
+))
+db_seconds_per_request = registry.register(Histogram(
+    "orders_db_seconds_per_request", "Time spent in database queries by a request", ("method", "route"),
+))
+outbound_requests = registry.register(Histogram(
+    "orders_outbound_request_duration_seconds",
+    "Time of the calls to the downstream services, per attempt",
+    ("service", "method", "status"),
+))
+outbound_in_flight = registry.register(Gauge(
+    "orders_outbound_requests_in_flight", "Calls to the downstream services awaiting a response", ("service",),
+))
+
+
+def _pool_connections():
+    # Imported when the metrics are rendered, the unit of work module instruments its engines with this one
+    from orders.repository.unit_of_work import pool_stats
+    stats = pool_stats()
+    values = {("primary", "checked_out"): stats["checked_out"], ("primary", "checked_in"): stats["checked_in"]}
+    if "read" in stats:
+        values[("read", "checked_out")] = stats["read"]["checked_out"]
+        values[("read", "checked_in")] = stats["read"]["checked_in"]
+    return values
+
+
+db_pool_connections = registry.register(Gauge(
+    "orders_db_pool_connections", "Connections of the database pools", ("pool", "state"), function=_pool_connections,
+))
+
+
+def full():
+    """ Whether the per-query and per-call metrics are collected, on top of the per-request ones """
+    return BaseConfig.METRICS == "full"
+
+
+def instrument_engine(engine):
+    """ Time every query of a sync engine, or of the sync engine of an async one """
+    shared.instrument_engine(engine, db_queries)
+
+
+class MetricsMiddleware:
+    """ Raw ASGI middleware timing each request, labelled with its route template
+
+    The route is only known once the request is routed, so unmatched paths share one label
+    and cannot blow up the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or BaseConfig.METRICS == "off":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        request = RequestMetrics() if full() else None
+        token = current_request.set(request)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - start
+            http_in_flight.dec()
+            current_request.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_requests.observe(seconds, scope["method"], route, str(status))
+            if request is not None:
+                db_queries_per_request.observe(request.queries, scope["method"], route)
+                db_seconds_per_request.observe(request.query_seconds, scope["method"], route)
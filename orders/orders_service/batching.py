@@ -0,0 +1,81 @@
+import asyncio
+
+from orders.config import BaseConfig
+from orders.orders_service.exceptions import APIIntegrationError
+from orders.orders_service.http_client import kitchen_client
+
+
+class ScheduleBatcher:
+    """ Coalesces concurrent schedule requests into one POST /kitchen/schedules:batch call
+
+    A request waits at most max_delay seconds for others to join its batch, and a batch
+    is sent as soon as it holds max_size requests. Each caller gets back its own schedule id.
+    """
+
+    def __init__(self, max_size=None, max_delay=None):
+        self.max_size = max_size or BaseConfig.KITCHEN_BATCH_MAX_SIZE
+        self.max_delay = BaseConfig.KITCHEN_BATCH_MAX_DELAY if max_delay is None else max_delay
+        self.batches = 0
+        self.scheduled = 0
+        self._pending = []
+        self._timer = None
+        # Sending tasks are referenced until they finish, so they are not garbage collected
+        self._tasks = set()
+
+    async def schedule(self, items):
+        """ Schedule an order with the given items and return its schedule id """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(({"order": items}, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "scheduled": self.scheduled,
+            "avg_batch_size": self.scheduled / self.batches if self.batches else 0.0,
+        }
+
+    async def close(self):
+        """ Send the pending requests and wait for the batches in flight """
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        self.batches += 1
+        self.scheduled += len(batch)
+        try:
+            response = await kitchen_client.post(
+                "/schedules:batch", json={"schedules": [payload for payload, _ in batch]}
+            )
+            if response.status_code != 201:
+                raise APIIntegrationError(f"Could not schedule a batch of {len(batch)} orders")
+            # The kitchen returns the schedules in request order
+            schedule_ids = [schedule["id"] for schedule in response.json()["schedules"]]
+            if len(schedule_ids) != len(batch):
+                raise APIIntegrationError(f"Kitchen returned {len(schedule_ids)} schedules for {len(batch)} orders")
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), schedule_id in zip(batch, schedule_ids):
+            if not future.done():
+                future.set_result(schedule_id)
+
+
+schedule_batcher = ScheduleBatcher()
@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from orders.config import BaseConfig
+
+logger = logging.getLogger(__name__)
+
+
+class LRUOrderCache:
+    """ In-process LRU cache of orders, keyed by (user_id, order_id)
+
+    Only the writes of this process invalidate it, so it must not be used by a server with
+    several worker processes.
+
+    A lookup that misses returns a token, and the value read from the database is only
+    stored if the order has not been invalidated since the token was taken. A reader that
+    raced with a write can therefore never put the order back in its previous state.
+    """
+
+    def __init__(self, max_size, ttl, max_invalidations=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Clock value at which each order was last invalidated, oldest first
+        self._invalidated = OrderedDict()
+        self._max_invalidations = max_invalidations or max_size * 10
+        # Tokens taken before the oldest forgotten invalidation are rejected
+        self._floor = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    async def get(self, user_id, order_id):
+        """ Return the cached order or None, and the token to store the order with on a miss """
+        key = (user_id, str(order_id))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                order, expires_at = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return order, None
+                del self._entries[key]
+            self.misses += 1
+            return None, self._clock
+
+    async def put(self, user_id, order_id, order, token):
+        key = (user_id, str(order_id))
+        with self._lock:
+            if token < max(self._floor, self._invalidated.get(key[1], 0)):
+                # The order was written while it was read, the value may be stale
+                return
+            self._entries[key] = (order, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def invalidate(self, user_id, order_id):
+        key = (user_id, str(order_id))
+        with self._lock:
+            self._clock += 1
+            self._entries.pop(key, None)
+            self._invalidated.pop(key[1], None)
+            self._invalidated[key[1]] = self._clock
+            while len(self._invalidated) > self._max_invalidations:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class RedisOrderCache:
+    """ Order cache on a Redis-compatible server, shared by every process of the service
+
+    Each order has a generation counter, bumped on invalidation, and a cached order is
+    stored with the generation it was read at. An entry is only served while its
+    generation is current, so a value stored by a reader that raced with a write is
+    ignored. Server errors are logged and handled as misses.
+    """
+
+    def __init__(self, url, ttl, prefix="orders:cache"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as error:
+            raise RuntimeError("The redis order cache backend requires the redis package") from error
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _keys(self, user_id, order_id):
+        return f"{self.prefix}:{user_id}:{order_id}", f"{self.prefix}:generation:{order_id}"
+
+    async def get(self, user_id, order_id):
+        key, generation_key = self._keys(user_id, order_id)
+        try:
+            entry, generation = await self.client.mget(key, generation_key)
+        except Exception as error:
+            self._error("get", error)
+            return None, None
+        generation = int(generation or 0)
+        if entry is not None:
+            entry = json.loads(entry)
+            if entry["generation"] == generation:
+                self.hits += 1
+                return entry["order"], None
+        self.misses += 1
+        return None, generation
+
+    async def put(self, user_id, order_id, order, token):
+        if token is None:
+            return
+        key, _ = self._keys(user_id, order_id)
+        entry = json.dumps({"generation": token, "order": order}, default=_json_default)
+        try:
+            await self.client.set(key, entry, ex=int(self.ttl) or 1)
+        except Exception as error:
+            self._error("put", error)
+
+    async def invalidate(self, user_id, order_id):
+        key, generation_key = self._keys(user_id, order_id)
+        try:
+            async with self.client.pipeline(transaction=True) as pipeline:
+                pipeline.incr(generation_key)
+                # The generation outlives every entry stored with an older generation
+                pipeline.expire(generation_key, int(self.ttl * 2) or 2)
+                pipeline.delete(key)
+                await pipeline.execute()
+        except Exception as error:
+            self._error("invalidate", error)
+
+    def _error(self, operation, error):
+        self.errors += 1
+        logger.warning("Order cache %s failed: %s", operation, error)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def create_order_cache():
+    """ Build the order cache selected by ORDERS_ORDER_CACHE_BACKEND, None when it is off """
+    if BaseConfig.ORDER_CACHE_BACKEND == "redis":
+        return RedisOrderCache(BaseConfig.REDIS_URL, BaseConfig.ORDER_CACHE_TTL)
+    if BaseConfig.ORDER_CACHE_BACKEND == "memory":
+        if BaseConfig.WORKERS > 1:
+            logger.warning("The memory order cache is per process, it is off with %d workers", BaseConfig.WORKERS)
+            return None
+        return LRUOrderCache(BaseConfig.ORDER_CACHE_SIZE, BaseConfig.ORDER_CACHE_TTL)
+    return None
+
+
+order_cache = create_order_cache()
@@ -0,0 +1,57 @@
+import asyncio
+from collections import defaultdict
+
+from orders.config import BaseConfig
+
+
+class OrderEvents:
+    """ In-process pub/sub of order state changes, with a bounded queue per subscriber
+
+    An idle subscription is a queue waiting on the event loop, with no task, thread or
+    database connection of its own. When a slow subscriber lets its queue fill up, the
+    oldest event is dropped: each event is a snapshot of the order, so the latest wins.
+    Only changes made by this process are published.
+    """
+
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or BaseConfig.EVENTS_QUEUE_SIZE
+        self.published = 0
+        self.dropped = 0
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, order_id):
+        """ Return a queue that receives the events of an order until it is unsubscribed """
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers[str(order_id)].add(queue)
+        return queue
+
+    def unsubscribe(self, order_id, queue):
+        subscribers = self._subscribers.get(str(order_id))
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[str(order_id)]
+
+    def publish(self, order_id, event):
+        self.published += 1
+        for queue in self._subscribers.get(str(order_id), ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    def stats(self):
+        return {
+            "orders": len(self._subscribers),
+            "subscriptions": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+def order_event(order, status=None):
+    """ Event published when an order changes, a snapshot of its status and version """
+    return {"id": str(order.id), "status": status or order.status, "version": order.version}
+
+
+order_events = OrderEvents()
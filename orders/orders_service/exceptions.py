@@ -8,4 +8,12 @@ class APIIntegrationError(Exception):
 
 class InvalidActionError(Exception):
     """ Exception to signal that the action being performed is invalid """
-    pass
\ No newline at end of file
+    pass
+
+class CircuitOpenError(APIIntegrationError):
+    """ Exception to signal that calls to a failing service are short-circuited """
+    pass
+
+class InvalidCursorError(Exception):
+    """ Exception to signal that a pagination cursor cannot be decoded """
+    pass
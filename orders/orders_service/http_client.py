@@ -0,0 +1,172 @@
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+
+from orders import metrics
+from orders.config import BaseConfig
+from orders.orders_service.exceptions import APIIntegrationError, CircuitOpenError
+
+
+class CircuitBreaker:
+    """ Stops calling a service after repeated failures, then lets one trial call through """
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "half-open":
+            # Let this call through as the trial and keep the others out until it resolves
+            self.opened_at = time.monotonic()
+            return True
+        return state == "closed"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        # A failed trial call in half-open state opens the circuit again
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class CallStats:
+    """ Latency counters of the calls made to one downstream service """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_seconds": self.total_seconds / self.calls if self.calls else 0.0,
+            "max_seconds": self.max_seconds,
+        }
+
+
+class ServiceClient:
+    """ Pooled keep-alive HTTP client for one downstream service """
+
+    def __init__(self, name, base_url, transport=None):
+        self.name = name
+        self.base_url = base_url
+        # An httpx transport can be injected to run against a stub
+        self.transport = transport
+        self.breaker = CircuitBreaker(BaseConfig.HTTP_BREAKER_THRESHOLD, BaseConfig.HTTP_BREAKER_RESET)
+        self.stats = CallStats()
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=self.transport,
+                timeout=httpx.Timeout(BaseConfig.HTTP_READ_TIMEOUT, connect=BaseConfig.HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=BaseConfig.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=BaseConfig.HTTP_MAX_CONNECTIONS,
+                ),
+            )
+        return self._client
+
+    async def request(self, method, path, idempotent=False, **kwargs):
+        """ Send a request, retrying idempotent calls on connection errors and 5xx responses """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Calls to the {self.name} service are suspended")
+
+        attempts = 1 + BaseConfig.HTTP_MAX_RETRIES if idempotent else 1
+        for attempt in range(attempts):
+            start = time.perf_counter()
+            try:
+                response = await self._send(method, path, **kwargs)
+            except httpx.TransportError as error:
+                self.stats.record(time.perf_counter() - start, error=True)
+                if attempt + 1 == attempts:
+                    # The breaker counts logical calls, not the attempts of one call
+                    self.breaker.record_failure()
+                    raise APIIntegrationError(f"Could not reach the {self.name} service: {error}") from error
+            else:
+                failed = response.status_code >= 500
+                self.stats.record(time.perf_counter() - start, error=failed)
+                if not failed:
+                    self.breaker.record_success()
+                    return response
+                if attempt + 1 == attempts:
+                    self.breaker.record_failure()
+                    return response
+            # Exponential backoff with full jitter between attempts
+            await asyncio.sleep(random.uniform(0, BaseConfig.HTTP_RETRY_BACKOFF * 2 ** attempt))
+
+    async def _send(self, method, path, **kwargs):
+        if not metrics.full():
+            return await self.client.request(method, path, **kwargs)
+        status = "error"
+        metrics.outbound_in_flight.inc(self.name)
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            metrics.outbound_in_flight.dec(self.name)
+            metrics.outbound_requests.observe(time.perf_counter() - start, self.name, method, status)
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, idempotent=True, **kwargs)
+
+    async def post(self, path, idempotent=False, **kwargs):
+        return await self.request("POST", path, idempotent=idempotent, **kwargs)
+
+    async def aclose(self):
+        client = self._client
+        self._client = None
+        if client is not None:
+            await client.aclose()
+
+
+# One client and connection pool per downstream service
+kitchen_client = ServiceClient("kitchen", BaseConfig.KITCHEN_API_URL)
+payments_client = ServiceClient("payments", BaseConfig.PAYMENTS_API_URL)
+
+
+def clients_stats():
+    """ Return the call statistics and circuit state of every downstream service """
+    return {
+        client.name: {**client.stats.dict(), "circuit": client.breaker.state}
+        for client in (kitchen_client, payments_client)
+    }
+
+
+async def close_clients():
+    """ Close the downstream clients and their pooled connections """
+    await kitchen_client.aclose()
+    await payments_client.aclose()
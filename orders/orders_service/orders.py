@@ -1,21 +1,43 @@
-import requests
+from orders.config import BaseConfig
+from orders.orders_service.batching import schedule_batcher
 from orders.orders_service.exceptions import (APIIntegrationError, InvalidActionError)
+from orders.orders_service.http_client import kitchen_client, payments_client
 
 
 class OrderItem:
     """ Business object that represent an order item """
+    # Slotted, so that large listings do not pay for a __dict__ per object
+    __slots__ = ('id', 'product', 'quantity', 'size')
+
     def __init__(self, id, product, quantity, size):
         self.id = id
         self.product = product
         self.quantity = quantity
         self.size = size
 
+    @classmethod
+    def from_record(cls, record):
+        return cls(record.id, record.product, record.quantity, record.size)
+
+    def dict(self):
+        return {
+            'product': self.product,
+            'size': self.size,
+            # quantity is stored as a string column
+            'quantity': int(self.quantity),
+        }
+
 
 class Order: 
     """ for the order service """
-    def __init__(self, id, created, items, status, schedule_id=None, delivery_id=None, order_ = None):
+    __slots__ = ('_order', '_id', 'user_id', 'version', '_created', 'items', '_status', 'schedule_id', 'delivery_id')
+
+    def __init__(self, id, created, items, status, schedule_id=None, delivery_id=None, user_id=None, version=None, order_ = None):
         # the order parameter represents a database model instance
+        self._order = order_
         self._id = id
+        self.user_id = user_id
+        self.version = version
         self._created = created
         # An OrderItem object for each order item 
         self.items = [OrderItem(**item) for item in items]
@@ -23,6 +45,16 @@ class Order:
         self.schedule_id = schedule_id
         self.delivery_id = delivery_id
 
+    @classmethod
+    def from_record(cls, record, order_=None):
+        """ Build an order straight from an OrderModel, without an intermediate dict """
+        order = cls(
+            record.id, record.created, (), record.status, record.schedule_id, record.delivery_id,
+            record.user_id, record.version, order_,
+        )
+        order.items = [OrderItem.from_record(item) for item in record.items]
+        return order
+
     # resolve the id dynamically by using property() decorator
     @property
     def id(self):
@@ -36,13 +68,21 @@ class Order:
     def status(self):
         return self._status or self._order.status
 
+    def dict(self):
+        return {
+            'id': self.id,
+            'order': [item.dict() for item in self.items],
+            'status': self.status,
+            'created': self.created,
+        }
+
 
-    def cancel(self):
+    async def cancel(self):
         """Method to call for cancelling an order"""
-        if self.status== 'progress': 
-        # If an order is in progress, we cancel its schedule bycalling the kitchen API.
-            kitchen_base_url = "http://localhost:3000/kitchen"
-            response = requests.post(f"{kitchen_base_url}/schedules/{self.schedule_id}/cancel", json={"order": [item.dict() for item in self.items]},)
+        if self.status in ('scheduled', 'progress'):
+        # If an order is scheduled or in progress, we cancel its schedule bycalling the kitchen API.
+            # Cancelling a schedule twice has the same effect, so the call can be retried
+            response = await kitchen_client.post(f"/schedules/{self.schedule_id}/cancel", idempotent=True, json={"order": [item.dict() for item in self.items]},)
 
             if response.status_code == 200:
                 # if response is successful, return 
@@ -55,9 +95,13 @@ class Order:
             raise InvalidActionError(f"Cannot cancel order with id {self.id}")
 
     
-    def pay(self): 
+    async def pay(self, idempotency_key=None): 
         """ Process the payment by calling the payment API """
-        response = requests.post("http://localhost:3001/payments", json={'order_id': self.id})
+        if idempotency_key is not None:
+            # The payments API charges once per key, so the call is safe to retry
+            response = await payments_client.post("/payments", idempotent=True, json={'order_id': self.id}, headers={'Idempotency-Key': idempotency_key})
+        else:
+            response = await payments_client.post("/payments", json={'order_id': self.id})
 
         if response.status_code == 201:
             return
@@ -65,13 +109,20 @@ class Order:
         raise APIIntegrationError(f"Could not process payment  for order with id {self.id}")    
 
     
-    def schedule(self):
+    async def schedule(self):
         """ Schedule an order for production by calling the kitchen API """
 
-        response = requests.post("http://localhost:3000/kitchen/schedules", json={"order": [item.dict() for item in self.items]})
+        if BaseConfig.KITCHEN_BATCHING:
+            # Concurrent schedule requests share a single call to the kitchen API
+            try:
+                return await schedule_batcher.schedule([item.dict() for item in self.items])
+            except APIIntegrationError as error:
+                raise APIIntegrationError(f"Could not schedule order with id {self.id}") from error
+
+        response = await kitchen_client.post("/schedules", json={"order": [item.dict() for item in self.items]})
 
         if response.status_code == 201:
             # If the response from the kitchen service is successful, we return the schedule ID.
             return response.json()['id']
 
-        raise APIIntegrationError(f"Could not schedule order with id {self.id}")
\ No newline at end of file
+        raise APIIntegrationError(f"Could not schedule order with id {self.id}")
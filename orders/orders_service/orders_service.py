@@ -1,52 +1,137 @@
-from .exceptions import OrderNotFoundError
+from .events import order_event
+from .exceptions import InvalidActionError, OrderNotFoundError
+from .pagination import decode_cursor, encode_cursor
 
 
 class OrdersService:
-    def __init__(self, orders_repository):
+    def __init__(self, orders_repository, outbox_repository=None, cache=None, events=None):
         # Instantiate the orders_repository class
         self.orders_repository = orders_repository
+        # Side effects to run after commit are recorded in the outbox
+        self.outbox_repository = outbox_repository
+        # Optional read-through cache of order response dicts
+        self.cache = cache
+        # Optional pub/sub that state changes are published to
+        self.events = events
 
-    def place_order(self, items, user_id):
+    async def place_order(self, items, user_id):
         # Place an order by creating a database record
-        return self.orders_repository.add(items, user_id)
+        return await self.orders_repository.add(items, user_id)
 
-    def get_order(self, order_id, **filters):
-        order = self.orders_repository.get(order_id, **filters)
+    async def place_orders(self, orders, user_id):
+        # Place many orders at once with a bulk insert
+        return await self.orders_repository.add_many(orders, user_id)
+
+    async def get_order(self, order_id, **filters):
+        order = await self.orders_repository.get(order_id, **filters)
         if order is None:
             raise OrderNotFoundError(f"Order with id {order_id} not found")
         return order
 
+    async def get_order_dict(self, order_id, user_id):
+        """ Return the response dict of an order and its version, read through the cache when there is one """
+        entry = None
+        if self.cache is not None:
+            entry, token = await self.cache.get(user_id, order_id)
+        if entry is None:
+            order = await self.get_order(order_id, user_id=user_id)
+            entry = {'order': order.dict(), 'version': order.version}
+            if self.cache is not None:
+                await self.cache.put(user_id, order_id, entry, token)
+        return entry['order'], entry['version']
+
+    async def get_order_version(self, order_id, user_id):
+        """ Return the version of an order, from the cache or without loading the order """
+        if self.cache is not None:
+            entry, _ = await self.cache.get(user_id, order_id)
+            if entry is not None:
+                return entry['version']
+        version = await self.orders_repository.get_version(order_id, user_id=user_id)
+        if version is None:
+            raise OrderNotFoundError(f"Order with id {order_id} not found")
+        return version
+
+    def _changed(self, order_id, user_id, event):
+        # Run after the commit, so that a concurrent miss cannot cache the previous state
+        # and subscribers are never told about a change that is rolled back
+        async def after_commit():
+            if self.cache is not None:
+                await self.cache.invalidate(user_id, order_id)
+            if self.events is not None:
+                self.events.publish(order_id, event)
+
+        self.orders_repository.on_commit(after_commit)
 
-    def update_order(self, order_id, user_id, **payload):
-        order = self.orders_repository.get(order_id, user_id=user_id)
+
+    async def update_order(self, order_id, user_id, **payload):
+        order = await self.orders_repository.get(order_id, user_id=user_id)
         if order is None: 
             raise OrderNotFoundError(f'Order with id {order_id} not found')
-        return self.orders_repository.update(order_id, **payload)
+        order = await self.orders_repository.update(order_id, **payload)
+        self._changed(order_id, user_id, order_event(order))
+        return order
 
 
-    def list_orders(self, **filters):
+    async def list_orders(self, **filters):
+        """ Return a page of orders and the cursor of the next page, if any """
         limit = filters.pop('limit', None)
-        return self.orders_repository.list(limit, **filters)
+        cursor = filters.pop('cursor', None)
+        after = decode_cursor(cursor) if cursor else None
+        # Fetch one extra row to know whether there is a next page
+        # Listings are returned as plain dicts, without an Order object per row
+        orders = await self.orders_repository.list_dicts(
+            limit + 1 if limit is not None else None, after=after, **filters
+        )
+        next_cursor = None
+        if limit is not None and len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1]['created'], orders[-1]['id'])
+        return orders, next_cursor
     
 
-    def pay_order(self, order_id, user_id):
-        order = self.orders_repository.get(order_id, user_id=user_id)
+    def export_orders(self, batch_size, **filters):
+        """ Return an async iterator over batches of order response dicts, oldest first """
+        return self.orders_repository.stream_dicts(batch_size=batch_size, **filters)
+
+    async def pay_order(self, order_id, user_id):
+        """ Request the payment of an order, processed in the background by the outbox dispatcher """
+        order = await self.orders_repository.get(order_id, user_id=user_id)
         if order is None:
             raise OrderNotFoundError(f'Order with id {order_id} not found')
-        order.pay()
-        schedule_id = order.schedule()
+        if order.status in ('payment_pending', 'paid', 'scheduled'):
+            # The payment was already requested, asking again has no effect
+            return order
+        if order.status != 'created':
+            raise InvalidActionError(f'Cannot pay order with id {order_id} in status {order.status}')
 
-        return self.orders_repository.update(order_id, {'status': 'scheduled', 'schedule_id': schedule_id})
+        # The status change and the outbox message are committed together by the caller
+        if await self.orders_repository.transition(order_id, 'created', status='payment_pending'):
+            await self.outbox_repository.add('pay_order', order_id)
+            order = await self.orders_repository.get(order_id, user_id=user_id)
+            self._changed(order_id, user_id, order_event(order))
+        return order
 
-    def cancel_order(self, order_id, user_id):
-        order = self.orders_repository.get(order_id, user_id=user_id)
+    async def cancel_order(self, order_id, user_id):
+        order = await self.orders_repository.get(order_id, user_id=user_id)
         if order is None:
             raise OrderNotFoundError(f'Order with id {order_id} not found')
-        order.cancel()
-        return self.orders_repository.update(order, status='cancelled')
+        if order.status == 'cancelled':
+            return order
+        if order.status in ('payment_pending', 'paid'):
+            # The outbox dispatcher is charging the order and scheduling it, cancelling now
+            # would leave the customer charged for an order that is never made
+            raise InvalidActionError(f'Cannot cancel order with id {order_id} while its payment is processed')
+        await order.cancel()
+        # Only cancel from the status checked above, a payment requested meanwhile wins
+        if not await self.orders_repository.transition(order_id, order.status, status='cancelled'):
+            raise InvalidActionError(f'Order with id {order_id} changed while it was cancelled')
+        order = await self.orders_repository.get(order_id, user_id=user_id)
+        self._changed(order_id, user_id, order_event(order))
+        return order
 
-    def delete_order(self, order_id, user_id):
-        order = self.orders_repository.get(order_id, user_id=user_id)
+    async def delete_order(self, order_id, user_id):
+        order = await self.orders_repository.get(order_id, user_id=user_id)
         if order is None:
             raise OrderNotFoundError(f"Order with id {order_id} not found")
-        return self.orders_repository.delete(order_id)
\ No newline at end of file
+        self._changed(order_id, user_id, order_event(order, status='deleted'))
+        return await self.orders_repository.delete(order_id)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import random
+
+from orders.config import BaseConfig
+from orders.orders_service.cache import order_cache
+from orders.orders_service.events import order_events
+from orders.repository.orders_repository import AsyncOrdersRepository
+from orders.repository.outbox_repository import OutboxRepository
+from orders.repository.unit_of_work import AsyncUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """ Background task that drains the outbox and runs the side effects of each message
+
+    Messages are claimed in batches and processed concurrently. A failed message is retried
+    with exponential backoff until it runs out of attempts, and its id is sent as the
+    idempotency key of the payment, so a retry never charges twice. A message out of attempts
+    moves its order to a failed status, in the same transaction, for support to follow up.
+    """
+
+    def __init__(self):
+        self.handlers = {'pay_order': self._pay_order}
+        self.failure_handlers = {'pay_order': self._pay_order_failed}
+        self._task = None
+        self._wake = None
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """ Wake the dispatcher up, after a message has been committed """
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.dispatch_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                processed = 0
+            # A full batch means there may be more due messages, otherwise wait for a commit or the next poll
+            if processed < BaseConfig.OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), BaseConfig.OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def dispatch_once(self):
+        """ Claim a batch of due messages, process them and return how many there were """
+        async with AsyncUnitOfWork() as unit_of_work:
+            messages = await OutboxRepository(unit_of_work.session).claim(
+                BaseConfig.OUTBOX_BATCH_SIZE, BaseConfig.OUTBOX_LEASE
+            )
+            await unit_of_work.commit()
+        await asyncio.gather(*(self._process(message) for message in messages))
+        return len(messages)
+
+    async def _process(self, message):
+        try:
+            await self.handlers[message['kind']](message)
+        except Exception as error:
+            logger.warning("Outbox message %s failed: %s", message['id'], error)
+            async with AsyncUnitOfWork() as unit_of_work:
+                outbox = OutboxRepository(unit_of_work.session)
+                if message['attempts'] >= BaseConfig.OUTBOX_MAX_ATTEMPTS:
+                    await outbox.fail(message['id'], error)
+                    await self.failure_handlers[message['kind']](AsyncOrdersRepository(unit_of_work.session), message)
+                else:
+                    # Exponential backoff with full jitter
+                    delay = random.uniform(0, BaseConfig.OUTBOX_RETRY_BACKOFF * 2 ** message['attempts'])
+                    await outbox.retry(message['id'], delay, error)
+                await unit_of_work.commit()
+        else:
+            async with AsyncUnitOfWork() as unit_of_work:
+                await OutboxRepository(unit_of_work.session).complete(message['id'])
+                await unit_of_work.commit()
+
+    async def _pay_order(self, message):
+        """ Charge the order, then schedule it in the kitchen, committing after each step
+
+        Each step only runs from the status the previous one left, so a retried message
+        resumes where it stopped, and an order cancelled in the meantime is left alone.
+        """
+        async with AsyncUnitOfWork() as unit_of_work:
+            order = await AsyncOrdersRepository(unit_of_work.session).get(message['order_id'])
+        if order is None:
+            return
+
+        status = order.status
+        if status == 'payment_pending':
+            await order.pay(idempotency_key=message['id'])
+            async with AsyncUnitOfWork() as unit_of_work:
+                repository = AsyncOrdersRepository(unit_of_work.session)
+                if await repository.transition(order.id, 'payment_pending', status='paid'):
+                    status = 'paid'
+                    await self._changed(repository, order, status)
+                await unit_of_work.commit()
+
+        if status == 'paid':
+            schedule_id = await order.schedule()
+            async with AsyncUnitOfWork() as unit_of_work:
+                repository = AsyncOrdersRepository(unit_of_work.session)
+                if await repository.transition(order.id, 'paid', status='scheduled', schedule_id=schedule_id):
+                    await self._changed(repository, order, 'scheduled')
+                await unit_of_work.commit()
+
+    async def _pay_order_failed(self, repository, message):
+        """ Flag an order the payment or the scheduling gave up on, from the step it stopped at
+
+        payment_failed orders were never charged, schedule_failed ones were charged but are
+        not made by the kitchen.
+        """
+        order = await repository.get(message['order_id'])
+        if order is None:
+            return
+        status = {'payment_pending': 'payment_failed', 'paid': 'schedule_failed'}.get(order.status)
+        if status is not None and await repository.transition(order.id, order.status, status=status):
+            await self._changed(repository, order, status)
+
+    @staticmethod
+    async def _changed(repository, order, status):
+        # Same as OrdersService: invalidate the cache and publish the change once it is committed
+        event = {"id": str(order.id), "status": status, "version": await repository.get_version(order.id)}
+
+        async def after_commit():
+            if order_cache is not None:
+                await order_cache.invalidate(order.user_id, order.id)
+            order_events.publish(order.id, event)
+
+        repository.on_commit(after_commit)
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,22 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from orders.orders_service.exceptions import InvalidCursorError
+
+
+def encode_cursor(created, id_):
+    """ Encode the (created, id) key of the last order of a page into an opaque cursor """
+    key = json.dumps([created.isoformat(), id_]).encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """ Decode a cursor back into the (created, id) key it was built from """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, id_ = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created), str(id_)
+    except (binascii.Error, ValueError, TypeError) as error:
+        raise InvalidCursorError(f"Invalid cursor {cursor}") from error
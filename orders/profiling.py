@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+from observability.profiling import ID_HEADER, PROFILERS, TOKEN_HEADER, ProfileStore, token_matches, wants_profile
+from orders.config import BaseConfig
+
+profile_store = ProfileStore(BaseConfig.PROFILING_DIR, BaseConfig.PROFILING_MAX_FILES)
+
+
+def is_admin(token):
+    """ Whether a token is the admin token of the profiling, which is off without one """
+    return token_matches(token, BaseConfig.PROFILING_TOKEN)
+
+
+class ProfilingMiddleware:
+    """ Raw ASGI middleware profiling a sample of the requests, and the requests of an admin
+
+    A request is profiled when it carries the admin token in the X-Profile-Token header, or
+    with a probability of PROFILING_SAMPLE_RATE percent. One request is profiled at a time,
+    for at most PROFILING_MAX_SECONDS. Requests of an admin get the name of their profile
+    in the X-Profile-Id header, sampled requests are profiled without telling the client.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = False
+
+    @staticmethod
+    def _token(scope):
+        for name, value in scope["headers"]:
+            if name == TOKEN_HEADER.lower().encode():
+                return value.decode("latin-1")
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or BaseConfig.PROFILING == "off" or self._busy:
+            return await self.app(scope, receive, send)
+        token = self._token(scope)
+        if not wants_profile(scope["path"], token, BaseConfig.PROFILING_TOKEN, BaseConfig.PROFILING_SAMPLE_RATE):
+            return await self.app(scope, receive, send)
+
+        profiler = PROFILERS[BaseConfig.PROFILING]
+        session = profiler(threading.get_ident(), BaseConfig.PROFILING_MAX_SECONDS, BaseConfig.PROFILING_SAMPLER_INTERVAL)
+        name = profile_store.new_name(scope["method"], scope["path"], profiler.extension)
+
+        admin = is_admin(token)
+
+        async def send_with_profile_id(message):
+            if admin and message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (ID_HEADER.lower().encode(), name.encode())]
+            # Long responses, like event streams, stop being profiled past the deadline
+            session.check_deadline()
+            await send(message)
+
+        self._busy = True
+        try:
+            session.start()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                session.stop()
+            # Written off the event loop, the response has been sent already
+            await asyncio.to_thread(profile_store.save, session, name)
+        finally:
+            self._busy = False
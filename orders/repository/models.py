@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -13,6 +13,10 @@ def generate_uuid():
 
 class OrderModel(Base):
     __tablename__ = 'order'
+    __table_args__ = (
+        Index('ix_order_user_id_created_id', 'user_id', 'created', 'id'),
+        Index('ix_order_user_id_status_created_id', 'user_id', 'status', 'created', 'id'),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     user_id = Column(String, nullable=False)
@@ -21,15 +25,19 @@ class OrderModel(Base):
     created = Column(DateTime, default=datetime.utcnow)
     schedule_id = Column(String)
     delivery_id = Column(String)
+    # Incremented by every update, used as the ETag of the order
+    version = Column(Integer, nullable=False, default=1)
 
     def dict(self):
         return {
             'id': self.id,
+            'user_id': self.user_id,
             'items': [item.dict() for item in self.items],
             'status': self.status,
             'created': self.created,
             'schedule_id': self.schedule_id,
             'delivery_id': self.delivery_id,
+            'version': self.version,
         }
 
 
@@ -37,7 +45,7 @@ class OrderItemModel(Base):
     __tablename__ = 'order_item'
 
     id = Column(String, primary_key=True, default=generate_uuid)
-    order_id = Column(Integer, ForeignKey('order.id'))
+    order_id = Column(String, ForeignKey('order.id'), index=True)
     product = Column(String, nullable=False)
     size = Column(String, nullable=False)
     quantity = Column(String, nullable=False)
@@ -48,4 +56,31 @@ class OrderItemModel(Base):
             'product': self.product,
             'size': self.size,
             'quantity': self.quantity
-        }
\ No newline at end of file
+        }
+
+
+class OutboxMessageModel(Base):
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        Index('ix_outbox_status_available_at', 'status', 'available_at'),
+    )
+
+    # The id doubles as the idempotency key of the side effects of the message
+    id = Column(String, primary_key=True, default=generate_uuid)
+    kind = Column(String, nullable=False)
+    order_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    # Next time the message may be claimed, pushed forward while a dispatcher holds it
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = Column(String, index=True)
+    last_error = Column(String)
+    created = Column(DateTime, default=datetime.utcnow)
+
+    def dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'order_id': self.order_id,
+            'attempts': self.attempts,
+        }
@@ -1,51 +1,138 @@
+from datetime import datetime
+
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.orm import selectinload
+
 from orders.orders_service.orders import Order
 from orders.repository import models
 
 
+def _filter_orders(query, filters):
+    """ Apply the cancelled flag and the column filters to an orders query """
+    # Filter to see if order is cancelled
+    cancelled = filters.pop('cancelled', None)
+    if cancelled is not None:
+        if cancelled:
+            query = query.filter(models.OrderModel.status == 'cancelled')
+        else:
+            query = query.filter(models.OrderModel.status != 'cancelled')
+    for key, value in filters.items():
+        query = query.filter(getattr(models.OrderModel, key) == value)
+    return query
+
+
+def _summaries_query(limit, after, filters):
+    # Only the columns of the response are selected, no ORM objects are built
+    query = select(models.OrderModel.id, models.OrderModel.status, models.OrderModel.created)
+    query = _filter_orders(query, filters)
+    if after is not None:
+        # Keyset pagination: seek past the last (created, id) seen instead of skipping rows
+        query = query.filter(tuple_(models.OrderModel.created, models.OrderModel.id) < tuple_(*after))
+    # Most recent orders first
+    return query.order_by(models.OrderModel.created.desc(), models.OrderModel.id.desc()).limit(limit)
+
+
+def _export_query(since, filters):
+    # Oldest orders first, so that an export can be resumed from the created date of its last order
+    query = select(models.OrderModel.id, models.OrderModel.status, models.OrderModel.created)
+    query = _filter_orders(query, filters)
+    if since is not None:
+        query = query.filter(models.OrderModel.created >= since)
+    return query.order_by(models.OrderModel.created, models.OrderModel.id)
+
+
+def _items_query(order_ids):
+    # The items of every listed order are fetched with a single IN query
+    return select(
+        models.OrderItemModel.order_id,
+        models.OrderItemModel.product,
+        models.OrderItemModel.size,
+        models.OrderItemModel.quantity,
+    ).filter(models.OrderItemModel.order_id.in_(order_ids))
+
+
+def _summaries(order_rows):
+    orders = [
+        {'id': id_, 'order': [], 'status': status, 'created': created}
+        for id_, status, created in order_rows
+    ]
+    return orders, {order['id']: order for order in orders}
+
+
+def _attach_items(orders_by_id, item_rows):
+    for order_id, product, size, quantity in item_rows:
+        orders_by_id[order_id]['order'].append(
+            # quantity is stored as a string column
+            {'product': product, 'size': size, 'quantity': int(quantity)}
+        )
+
+
+def _item_values(item):
+    # quantity is stored as a string column, which asyncpg only binds from a str
+    return {**item, 'quantity': str(item['quantity'])}
+
+
+def _bulk_rows(orders, user_id):
+    # Keys and defaults are generated here, so the rows can go through executemany
+    order_rows, item_rows, results = [], [], []
+    for items in orders:
+        order_id = models.generate_uuid()
+        created = datetime.utcnow()
+        order_rows.append({'id': order_id, 'user_id': user_id, 'status': 'created', 'created': created, 'version': 1})
+        item_rows.extend(
+            {'id': models.generate_uuid(), 'order_id': order_id, **_item_values(item)} for item in items
+        )
+        results.append({'id': order_id, 'order': items, 'status': 'created', 'created': created})
+    return order_rows, item_rows, results
+
+
 class OrdersRepository:
     def __init__(self, session):
         # session object for the repository initializer method.
         self.session = session
 
     def add(self, items, user_id):
-        record = OrderModel(
+        record = models.OrderModel(
             # Create a record for each order item while recording the order
-            items=[models.OrderItemModel(**item) for item in items]
+            items=[models.OrderItemModel(**_item_values(item)) for item in items],
+            user_id=user_id,
         )
         # Add the record to the session object
         self.session.add(record)
         # Return an instance of order class
-        return Order(**record.dict(), order_=record)
+        return Order.from_record(record, order_=record)
 
     def _get(self, id_, **filters):
         # Method to retrieve order by id
-        return {
+        return (
             # Fetch the record using SQLAlchemy's first() method
-            self.session.query(models.OrderModel).filter(models.OrderModel.id == str(id_)).filter(**filters).first()
-        }
+            self.session.query(models.OrderModel).filter(models.OrderModel.id == str(id_)).filter_by(**filters).first()
+        )
     
     def get(self, id_, **filters):
         # Retrieve an order using the method above
         order = self._get(id_, **filters)
         if order is not None:
             # if the order exists, we return an Order object
-            return Order(**order.dict())
+            return Order.from_record(order)
 
     def list(self, limit=None, **filters):
         # Accepts a limit parameter and optional filters
-        query = self.session.query(models.OrderModel)
-        # Filter to see if order is cancelled
-        if 'cancelled' in filters:
-            cancelled = filters.pop('cancelled')
-            if cancelled:
-                query = query.filter(models.OrderModel.status == 'cancelled')
-            
-            else: 
-                query = query.filter(models.OrderModel != 'cancelled')
-
-        records = query.filter_by(**filters).limit(limit).all()
+        # The items of all the orders are loaded in one extra query instead of one per order
+        query = self.session.query(models.OrderModel).options(selectinload(models.OrderModel.items))
+        records = _filter_orders(query, filters).limit(limit).all()
         # Return a list of Order objects
-        return [Order(**record.dict()) for record in records]
+        return [Order.from_record(record) for record in records]
+
+    def list_dicts(self, limit=None, after=None, **filters):
+        """ List orders as response dicts in two queries, whatever the number of orders
+
+        after is the (created, id) key of the last order of the previous page.
+        """
+        orders, orders_by_id = _summaries(self.session.execute(_summaries_query(limit, after, filters)))
+        if orders:
+            _attach_items(orders_by_id, self.session.execute(_items_query(list(orders_by_id))))
+        return orders
 
     
     def update(self, id_, **payload):
@@ -54,14 +141,121 @@ class OrdersRepository:
             # To update an order, delete the items linked to the order
             for item in record.items:
                 self.session.delete(item)
-            record.items = [models.OrderItemModel(**item) for item in payload.pop('items')]
+            record.items = [models.OrderItemModel(**_item_values(item)) for item in payload.pop('items')]
         
         # Update the database object using setattr() funtion
         for key, value in payload.items():
             setattr(record, key, value)
+        # Replacing the items does not touch the order row, the version is bumped either way
+        record.version += 1
         
-        return Order(**record.dict())
+        return Order.from_record(record)
 
     
     def delete(self, id_):
-        self.session.delete(self._get(id_))
\ No newline at end of file
+        self.session.delete(self._get(id_))
+
+
+class AsyncOrdersRepository:
+    """ Orders repository on top of an AsyncSession """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def add(self, items, user_id):
+        record = models.OrderModel(
+            items=[models.OrderItemModel(**_item_values(item)) for item in items],
+            user_id=user_id,
+        )
+        self.session.add(record)
+        # Flush so that the id and created defaults are populated without a lazy load
+        await self.session.flush()
+        return Order.from_record(record, order_=record)
+
+    async def add_many(self, orders, user_id):
+        """ Insert many orders and their items with two bulk INSERTs, returning response dicts """
+        order_rows, item_rows, results = _bulk_rows(orders, user_id)
+        await self.session.execute(insert(models.OrderModel), order_rows)
+        await self.session.execute(insert(models.OrderItemModel), item_rows)
+        return results
+
+    def on_commit(self, callback):
+        """ Register a coroutine function to await once the unit of work has committed """
+        self.session.info.setdefault('on_commit', []).append(callback)
+
+    async def _get(self, id_, **filters):
+        # Items are loaded eagerly, lazy loading is not available on an AsyncSession
+        query = (
+            select(models.OrderModel)
+            .options(selectinload(models.OrderModel.items))
+            .filter(models.OrderModel.id == str(id_))
+            .filter_by(**filters)
+        )
+        return (await self.session.execute(query)).scalars().first()
+
+    async def get(self, id_, **filters):
+        order = await self._get(id_, **filters)
+        if order is not None:
+            return Order.from_record(order)
+
+    async def get_version(self, id_, **filters):
+        """ Return the version of an order, or None, without loading the order or its items """
+        query = (
+            select(models.OrderModel.version)
+            .filter(models.OrderModel.id == str(id_))
+            .filter_by(**filters)
+        )
+        return (await self.session.execute(query)).scalar()
+
+    async def list(self, limit=None, **filters):
+        query = select(models.OrderModel).options(selectinload(models.OrderModel.items))
+        records = (await self.session.execute(_filter_orders(query, filters).limit(limit))).scalars().all()
+        return [Order.from_record(record) for record in records]
+
+    async def list_dicts(self, limit=None, after=None, **filters):
+        """ List orders as response dicts in two queries, whatever the number of orders
+
+        after is the (created, id) key of the last order of the previous page.
+        """
+        orders, orders_by_id = _summaries(await self.session.execute(_summaries_query(limit, after, filters)))
+        if orders:
+            _attach_items(orders_by_id, await self.session.execute(_items_query(list(orders_by_id))))
+        return orders
+
+    async def stream_dicts(self, since=None, batch_size=1000, **filters):
+        """ Yield the orders as lists of at most batch_size response dicts, read with a server-side cursor
+
+        Only one batch is held at a time, whatever the number of orders.
+        """
+        result = await self.session.stream(_export_query(since, filters).execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            orders, orders_by_id = _summaries(rows)
+            _attach_items(orders_by_id, await self.session.execute(_items_query(list(orders_by_id))))
+            yield orders
+
+    async def update(self, id_, **payload):
+        record = await self._get(id_)
+        if 'items' in payload:
+            # To update an order, delete the items linked to the order
+            for item in record.items:
+                await self.session.delete(item)
+            record.items = [models.OrderItemModel(**_item_values(item)) for item in payload.pop('items')]
+
+        for key, value in payload.items():
+            setattr(record, key, value)
+        record.version += 1
+
+        return Order.from_record(record)
+
+    async def transition(self, id_, from_status, **values):
+        """ Update an order only if it is still in from_status, returns whether it was updated """
+        result = await self.session.execute(
+            update(models.OrderModel)
+            .where(models.OrderModel.id == str(id_))
+            .where(models.OrderModel.status == from_status)
+            .values(version=models.OrderModel.version + 1, **values)
+        )
+        return result.rowcount == 1
+
+    async def delete(self, id_):
+        await self.session.delete(await self._get(id_))
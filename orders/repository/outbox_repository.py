@@ -0,0 +1,81 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from orders.repository import models
+
+
+class OutboxRepository:
+    """ Messages written in the same transaction as the order changes they follow from """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def add(self, kind, order_id):
+        record = models.OutboxMessageModel(
+            id=models.generate_uuid(),
+            kind=kind,
+            order_id=str(order_id),
+            status='pending',
+            attempts=0,
+            available_at=datetime.utcnow(),
+        )
+        self.session.add(record)
+        return record.id
+
+    async def claim(self, limit, lease):
+        """ Claim up to limit due messages for lease seconds and return them as dicts
+
+        The conditional UPDATE makes sure that two dispatchers never claim the same message.
+        On PostgreSQL, messages locked by another dispatcher are skipped instead of waited for.
+        """
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        due = (
+            select(models.OutboxMessageModel.id)
+            .filter(models.OutboxMessageModel.status == 'pending')
+            .filter(models.OutboxMessageModel.available_at <= now)
+            .order_by(models.OutboxMessageModel.available_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        await self.session.execute(
+            update(models.OutboxMessageModel)
+            .where(models.OutboxMessageModel.id.in_(due.scalar_subquery()))
+            .where(models.OutboxMessageModel.status == 'pending')
+            .where(models.OutboxMessageModel.available_at <= now)
+            .values(
+                claim_token=token,
+                available_at=now + timedelta(seconds=lease),
+                attempts=models.OutboxMessageModel.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        records = await self.session.execute(
+            select(models.OutboxMessageModel).filter(models.OutboxMessageModel.claim_token == token)
+        )
+        return [record.dict() for record in records.scalars()]
+
+    async def complete(self, id_):
+        await self._set(id_, status='done', claim_token=None)
+
+    async def retry(self, id_, delay, error):
+        """ Release a message so that it is claimed again after delay seconds """
+        await self._set(
+            id_,
+            available_at=datetime.utcnow() + timedelta(seconds=delay),
+            claim_token=None,
+            last_error=str(error),
+        )
+
+    async def fail(self, id_, error):
+        await self._set(id_, status='failed', claim_token=None, last_error=str(error))
+
+    async def _set(self, id_, **values):
+        await self.session.execute(
+            update(models.OutboxMessageModel)
+            .where(models.OutboxMessageModel.id == id_)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
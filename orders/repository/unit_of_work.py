@@ -1,13 +1,185 @@
-from sqlalchemy import create_engine
+import threading
+
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+from orders import metrics
+from orders.config import BaseConfig
+
+
+# One engine and session factory per process, created on first use
+_engine = None
+_Session = None
+_async_engine = None
+_AsyncSession = None
+_async_read_engine = None
+_AsyncReadSession = None
+_lock = threading.Lock()
+
+
+def _sqlite_pragmas(read_only=False):
+    """ Return the PRAGMA statements of the configured SQLite profile """
+    pragmas = []
+    if BaseConfig.SQLITE_PROFILE == "tuned":
+        # WAL lets readers run alongside the writer. With NORMAL sync, commits survive a crash
+        # of the process and only the latest ones can be lost on power failure
+        pragmas += [
+            f"PRAGMA journal_mode={BaseConfig.SQLITE_JOURNAL_MODE}",
+            f"PRAGMA synchronous={BaseConfig.SQLITE_SYNCHRONOUS}",
+            f"PRAGMA busy_timeout={BaseConfig.SQLITE_BUSY_TIMEOUT}",
+            f"PRAGMA cache_size={BaseConfig.SQLITE_CACHE_SIZE}",
+            f"PRAGMA mmap_size={BaseConfig.SQLITE_MMAP_SIZE}",
+            f"PRAGMA temp_store={BaseConfig.SQLITE_TEMP_STORE}",
+        ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def _apply_sqlite_profile(engine, read_only=False):
+    """ Run the pragmas of the SQLite profile on every new connection of a sync engine """
+    pragmas = _sqlite_pragmas(read_only)
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def get_engine():
+    """ Return the process-wide engine, creating it on first use """
+    global _engine, _Session
+    if _engine is None:
+        with _lock:
+            # Another thread may have created the engine while we waited for the lock
+            if _engine is None:
+                _engine = create_engine(
+                    BaseConfig.DATABASE_URL,
+                    pool_size=BaseConfig.DB_POOL_SIZE,
+                    max_overflow=BaseConfig.DB_MAX_OVERFLOW,
+                    pool_timeout=BaseConfig.DB_POOL_TIMEOUT,
+                    pool_pre_ping=BaseConfig.DB_POOL_PRE_PING,
+                    pool_recycle=BaseConfig.DB_POOL_RECYCLE,
+                )
+                _apply_sqlite_profile(_engine)
+                if metrics.full():
+                    metrics.instrument_engine(_engine)
+                _Session = sessionmaker(bind=_engine)
+    return _engine
+
+
+def get_session_factory():
+    """ Return the process-wide session factory """
+    get_engine()
+    return _Session
+
+
+def _create_async_engine(url, pool_size, read_only=False):
+    options = {}
+    if read_only and make_url(url).get_backend_name() == "postgresql":
+        options["execution_options"] = {"postgresql_readonly": True}
+    engine = create_async_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=BaseConfig.DB_MAX_OVERFLOW,
+        pool_timeout=BaseConfig.DB_POOL_TIMEOUT,
+        pool_pre_ping=BaseConfig.DB_POOL_PRE_PING,
+        pool_recycle=BaseConfig.DB_POOL_RECYCLE,
+        **options,
+    )
+    # Connection events are registered on the sync engine the async engine wraps
+    _apply_sqlite_profile(engine.sync_engine, read_only)
+    if metrics.full():
+        metrics.instrument_engine(engine.sync_engine)
+    return engine
+
+
+def get_async_engine():
+    """ Return the process-wide async engine used by the API, creating it on first use """
+    global _async_engine, _AsyncSession
+    if _async_engine is None:
+        with _lock:
+            if _async_engine is None:
+                _async_engine = _create_async_engine(BaseConfig.ASYNC_DATABASE_URL, BaseConfig.DB_POOL_SIZE)
+                # Objects stay readable after commit, since lazy refreshes are not allowed in async code
+                _AsyncSession = async_sessionmaker(bind=_async_engine, expire_on_commit=False)
+    return _async_engine
+
+
+def get_async_read_engine():
+    """ Return the process-wide engine of the read-only pool, or the main engine when it is off """
+    global _async_read_engine, _AsyncReadSession
+    if not BaseConfig.DB_READ_POOL:
+        return get_async_engine()
+    if _async_read_engine is None:
+        with _lock:
+            if _async_read_engine is None:
+                _async_read_engine = _create_async_engine(
+                    BaseConfig.ASYNC_READ_DATABASE_URL, BaseConfig.DB_READ_POOL_SIZE, read_only=True
+                )
+                _AsyncReadSession = async_sessionmaker(bind=_async_read_engine, expire_on_commit=False)
+    return _async_read_engine
+
+
+def get_async_session_factory(read_only=False):
+    """ Return the process-wide async session factory, of the read-only pool if read_only """
+    if read_only and BaseConfig.DB_READ_POOL:
+        get_async_read_engine()
+        return _AsyncReadSession
+    get_async_engine()
+    return _AsyncSession
+
+
+def _pool_stats(pool):
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": BaseConfig.DB_MAX_OVERFLOW,
+    }
+
+
+def pool_stats():
+    """ Return a snapshot of the connection pool usage of the API engine, and of the read-only pool """
+    stats = _pool_stats(get_async_engine().pool)
+    if BaseConfig.DB_READ_POOL:
+        stats["read"] = _pool_stats(get_async_read_engine().pool)
+    return stats
+
+
+def dispose_engine():
+    """ Close every pooled connection and drop the process-wide engine """
+    global _engine, _Session
+    with _lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _Session = None
+
+
+async def dispose_async_engine():
+    """ Close every pooled connection and drop the process-wide async engines """
+    global _async_engine, _AsyncSession, _async_read_engine, _AsyncReadSession
+    engines = [_async_engine, _async_read_engine]
+    _async_engine = _async_read_engine = None
+    _AsyncSession = _AsyncReadSession = None
+    for engine in engines:
+        if engine is not None:
+            await engine.dispose()
+
 
 class UnitOfWork:
 
     def __init__(self):
         """ Initialize the session factory object """
-        self.engine = create_engine("sqlite:///orders.db")
-        self.Session = sessionmaker(bind=self.engine)
+        self.engine = get_engine()
+        self.Session = get_session_factory()
 
     def __enter__(self):
         self.session = self.Session()
@@ -20,7 +192,7 @@ class UnitOfWork:
         # Check whether an exception took place
         if exc_type is not None:
             self.rollback() # Rollback the session
-            self.session.close() # Close the database session
+        # Close the database session, returning its connection to the pool
         self.session.close()
 
     def commit(self):
@@ -29,4 +201,34 @@ class UnitOfWork:
 
     def rollback(self):
         """ Wrapper around SQLAlchemy's rollback() method """
-        self.session.rollback()
\ No newline at end of file
+        self.session.rollback()
+
+
+class AsyncUnitOfWork:
+
+    def __init__(self, read_only=False):
+        """ Initialize the async session factory object, of the read-only pool for read_only units of work """
+        self.engine = get_async_read_engine() if read_only else get_async_engine()
+        self.Session = get_async_session_factory(read_only)
+        # Reads of a replica may lag behind the primary
+        self.replica = read_only and BaseConfig.REPLICA_DATABASE_URL is not None
+
+    async def __aenter__(self):
+        self.session = self.Session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, traceback):
+        # Rollback if an exception took place, then return the connection to the pool
+        if exc_type is not None:
+            await self.rollback()
+        await self.session.close()
+
+    async def commit(self):
+        """ Wrapper around AsyncSession's commit() method, then runs the on_commit callbacks """
+        await self.session.commit()
+        for callback in self.session.info.pop('on_commit', []):
+            await callback()
+
+    async def rollback(self):
+        """ Wrapper around AsyncSession's rollback() method """
+        await self.session.rollback()
@@ -1,66 +1,304 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timezone
 from http import HTTPStatus
 from typing import Optional
 from uuid import UUID
 
 from fastapi import HTTPException, status, Request
-from fastapi.responses import Response
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import ValidationError, confloat, conint
 
-from orders.orders_service.exceptions import OrderNotFoundError
+from orders import metrics, profiling
+from orders.config import BaseConfig
+
+from orders.orders_service.exceptions import (
+    APIIntegrationError,
+    CircuitOpenError,
+    InvalidActionError,
+    InvalidCursorError,
+    OrderNotFoundError,
+)
+from orders.orders_service.batching import schedule_batcher
+from orders.orders_service.cache import order_cache
+from orders.orders_service.events import order_events
+from orders.orders_service.http_client import clients_stats
 from orders.orders_service.orders_service  import OrdersService
-from orders.repository.orders_repository import OrdersRepository
-from orders.repository.unit_of_work import UnitOfWork
+from orders.orders_service.outbox import outbox_dispatcher
+from orders.repository.orders_repository import AsyncOrdersRepository
+from orders.repository.outbox_repository import OutboxRepository
+from orders.repository.unit_of_work import AsyncUnitOfWork, pool_stats
+from orders.web.api import auth, responses
 from orders.web.app import app
-from orders.web.api.schemas import (GetOrderSchema, GetOrdersSchema, CreateOrderSchema)
+from orders.web.api.schemas import (
+    GetOrderSchema,
+    GetOrdersSchema,
+    OrderEventSchema,
+    CreateOrderSchema,
+    CreateOrdersBatchSchema,
+    CreateOrdersBatchResultSchema,
+    ExportFormat,
+)
+
+if BaseConfig.FAST_RESPONSES and responses.orjson is None:
+    # Fail on startup rather than on the first request when the optional dependency is missing
+    raise RuntimeError("ORDERS_FAST_RESPONSES requires the orjson package")
+
 
 @app.get("/orders", response_model=GetOrdersSchema)
-def get_orders(request: Request, cancelled: Optional[bool] = None, limit: Optional[int] = None):
+async def get_orders(request: Request, cancelled: Optional[bool] = None, limit: Optional[conint(ge=1)] = None, cursor: Optional[str] = None):
     """ Get all the orders with cancelled orders """
-    with UnitOfWork() as unit_of_work:
-        repo = OrdersRepository(unit_of_work.session)
-        orders_service = OrdersService(repo)
-        results = orders_service.list_orders(limit=limit, cancelled=cancelled, user_id=request.state.user_id)
-    
-    return {'orders': [result.model_dump() for result in results]}
+    try:
+        async with AsyncUnitOfWork(read_only=True) as unit_of_work:
+            repo = AsyncOrdersRepository(unit_of_work.session)
+            orders_service = OrdersService(repo)
+            results, next_cursor = await orders_service.list_orders(limit=limit, cursor=cursor, cancelled=cancelled, user_id=request.state.user_id)
+    except InvalidCursorError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    content = {'orders': results, 'next_cursor': next_cursor}
+    if BaseConfig.FAST_RESPONSES:
+        # Repository output is trusted, it is encoded as is instead of being validated against the response_model
+        return responses.ORJSONResponse(content)
+    return content
 
 
 @app.post("/orders", status_code=status.HTTP_201_CREATED,response_model=GetOrderSchema)
-def create_order(request: Request, payload: CreateOrderSchema):
-    with UnitOfWork() as unit_of_work:
-        repo = OrdersRepository(unit_of_work.session)
+async def create_order(request: Request, payload: CreateOrderSchema):
+    async with AsyncUnitOfWork() as unit_of_work:
+        repo = AsyncOrdersRepository(unit_of_work.session)
         orders_service = OrdersService(repo)
         order = payload.model_dump()['order']
         for item in order:
             item["size"] = item['size'].value
-        order = orders_service.place_order(order, request.state.user_id)
-        unit_of_work.commit()
+        order = await orders_service.place_order(order, request.state.user_id)
+        await unit_of_work.commit()
         user_response = order.dict()
     return user_response
 
 
-@app.get('/orders/{order_id}', response_model=GetOrderSchema)
-def get_order(request: Request, order_id: UUID):
-    try:
-        with UnitOfWork() as unit_of_work:
-            repo = OrdersRepository(unit_of_work.session)
+@app.post("/orders:batch", response_model=CreateOrdersBatchResultSchema)
+async def create_orders_batch(request: Request, payload: CreateOrdersBatchSchema):
+    """ Create many orders in a single transaction, with a result or errors per order """
+    results = [None] * len(payload.orders)
+    valid = []
+    for index, order_payload in enumerate(payload.orders):
+        try:
+            order = CreateOrderSchema.model_validate(order_payload).model_dump(mode='json')['order']
+        except ValidationError as error:
+            results[index] = {'index': index, 'status': 422, 'errors': error.errors(include_url=False, include_context=False)}
+        else:
+            valid.append((index, order))
+
+    if valid:
+        async with AsyncUnitOfWork() as unit_of_work:
+            repo = AsyncOrdersRepository(unit_of_work.session)
             orders_service = OrdersService(repo)
-            order = orders_service.get_order(order_id=order_id, user_id=request.state.user_id)
-        user_response = order.dict()
-        return user_response
+            orders = await orders_service.place_orders([order for _, order in valid], request.state.user_id)
+            await unit_of_work.commit()
+        for (index, _), order in zip(valid, orders):
+            results[index] = {'index': index, 'status': 201, 'order': order}
+
+    return {'results': results}
+
+
+EXPORT_CSV_COLUMNS = ['id', 'created', 'status', 'product', 'size', 'quantity']
+
+
+def export_ndjson(orders):
+    return ''.join(
+        json.dumps({**order, 'created': order['created'].isoformat()}) + '\n' for order in orders
+    )
+
+
+def export_csv(orders):
+    # One row per item, with the columns of its order repeated
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for order in orders:
+        created = order['created'].isoformat()
+        for item in order['order']:
+            writer.writerow([order['id'], created, order['status'], item['product'], item['size'], item['quantity']])
+    return buffer.getvalue()
+
+
+async def export_stream(format, **filters):
+    # The unit of work lives as long as the response, the orders are read while they are sent
+    async with AsyncUnitOfWork(read_only=True) as unit_of_work:
+        orders_service = OrdersService(AsyncOrdersRepository(unit_of_work.session))
+        if format is ExportFormat.csv:
+            yield ','.join(EXPORT_CSV_COLUMNS) + '\r\n'
+        encode = export_csv if format is ExportFormat.csv else export_ndjson
+        async for orders in orders_service.export_orders(BaseConfig.EXPORT_BATCH_SIZE, **filters):
+            yield encode(orders)
+
+
+@app.get(
+    '/orders/export',
+    response_class=StreamingResponse,
+    responses={200: {'content': {'application/x-ndjson': {}, 'text/csv': {}}, 'description': 'The orders, oldest first'}},
+)
+async def export_orders(request: Request, format: ExportFormat = ExportFormat.ndjson, cancelled: Optional[bool] = None, since: Optional[datetime] = None):
+    """ Stream every order of the user as NDJSON or CSV, in constant memory """
+    if since is not None and since.tzinfo is not None:
+        # Order dates are stored as naive UTC
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    media_type = 'text/csv' if format is ExportFormat.csv else 'application/x-ndjson'
+    return StreamingResponse(
+        export_stream(format, cancelled=cancelled, since=since, user_id=request.state.user_id),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="orders.{format.value}"'},
+    )
+
+
+async def read_order(read):
+    """ Run read(orders_service) on the read-only pool, falling back to the primary when the
+    order is not found on a replica, which may not have received it yet """
+    async with AsyncUnitOfWork(read_only=True) as unit_of_work:
+        # Replica reads bypass the cache, which is only filled from the primary
+        cache = None if unit_of_work.replica else order_cache
+        try:
+            return await read(OrdersService(AsyncOrdersRepository(unit_of_work.session), cache=cache))
+        except OrderNotFoundError:
+            if not unit_of_work.replica:
+                raise
+    async with AsyncUnitOfWork() as unit_of_work:
+        return await read(OrdersService(AsyncOrdersRepository(unit_of_work.session), cache=order_cache))
+
+
+def make_etag(version):
+    return f'"{version}"'
+
+
+def etag_matches(if_none_match, etag):
+    """ Whether an If-None-Match header matches an ETag, with the weak comparison of RFC 9110 """
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+@app.get(
+    '/orders/{order_id}',
+    response_model=GetOrderSchema,
+    responses={status.HTTP_304_NOT_MODIFIED: {'description': 'The order has not changed'}},
+)
+async def get_order(request: Request, response: Response, order_id: UUID):
+    if_none_match = request.headers.get('if-none-match')
+
+    async def read(orders_service):
+        if if_none_match:
+            # Only the version is read to answer a conditional request
+            etag = make_etag(await orders_service.get_order_version(order_id=order_id, user_id=request.state.user_id))
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return await orders_service.get_order_dict(order_id=order_id, user_id=request.state.user_id)
+
+    try:
+        result = await read_order(read)
+        if isinstance(result, Response):
+            return result
+        order, version = result
+        if BaseConfig.FAST_RESPONSES:
+            return responses.ORJSONResponse(order, headers={'ETag': make_etag(version)})
+        response.headers['ETag'] = make_etag(version)
+        return order
+    except OrderNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Order with id {order_id} not found")
+
+async def subscribe_to_order(order_id, user_id):
+    """ Subscribe to the events of an order, returns the queue and the current state of the order """
+    # Subscribe before reading the order, so that a change made in between is not missed
+    queue = order_events.subscribe(order_id)
+    try:
+        order, version = await read_order(
+            lambda orders_service: orders_service.get_order_dict(order_id=order_id, user_id=user_id)
+        )
     except OrderNotFoundError:
+        order_events.unsubscribe(order_id, queue)
         raise HTTPException(status_code=404, detail=f"Order with id {order_id} not found")
+    except BaseException:
+        order_events.unsubscribe(order_id, queue)
+        raise
+    # The database session is closed, an idle subscription only holds its queue
+    return queue, {'id': str(order_id), 'status': order['status'], 'version': version}
+
+
+def is_newer(event, current):
+    # Events queued while the order was read can be older than the state already sent
+    return event['status'] == 'deleted' or event['version'] > current['version']
+
+
+async def order_event_stream(order_id, queue, current, last_event_id):
+    try:
+        # A client reconnecting with the id of the current version has seen it already
+        if last_event_id != str(current['version']):
+            yield f"id: {current['version']}\ndata: {json.dumps(current)}\n\n"
+        while current['status'] != 'deleted':
+            try:
+                event = await asyncio.wait_for(queue.get(), BaseConfig.EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing the idle connection, and finds out when the client is gone
+                yield ": keep-alive\n\n"
+                continue
+            if is_newer(event, current):
+                current = event
+                yield f"id: {current['version']}\ndata: {json.dumps(current)}\n\n"
+    finally:
+        order_events.unsubscribe(order_id, queue)
+
+
+@app.get(
+    '/orders/{order_id}/events',
+    response_class=StreamingResponse,
+    responses={200: {'content': {'text/event-stream': {}}, 'description': 'Stream of order events'}},
+)
+async def stream_order_events(request: Request, order_id: UUID):
+    """ Stream the current state of an order, then each of its changes, as server-sent events """
+    queue, current = await subscribe_to_order(order_id, request.state.user_id)
+    return StreamingResponse(
+        order_event_stream(order_id, queue, current, request.headers.get('last-event-id')),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.get(
+    '/orders/{order_id}/events:poll',
+    response_model=OrderEventSchema,
+    responses={status.HTTP_204_NO_CONTENT: {'description': 'The order did not change before the timeout'}},
+)
+async def poll_order_events(request: Request, order_id: UUID, version: Optional[int] = None, timeout: Optional[confloat(gt=0)] = None):
+    """ Long-poll: return the state of an order as soon as its version differs from version """
+    queue, current = await subscribe_to_order(order_id, request.state.user_id)
+    try:
+        if version is None or current['version'] != version:
+            return current
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(timeout or BaseConfig.EVENTS_MAX_WAIT, BaseConfig.EVENTS_MAX_WAIT)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                return Response(status_code=status.HTTP_204_NO_CONTENT)
+            if is_newer(event, current):
+                return event
+    finally:
+        order_events.unsubscribe(order_id, queue)
+
 
 @app.put('/orders/{order_id}', response_model=GetOrderSchema)
-def update_order(request: Request, order_id: UUID, payload: CreateOrderSchema):
+async def update_order(request: Request, order_id: UUID, payload: CreateOrderSchema):
     try:
-        with UnitOfWork() as unit_of_work:
-            repo = OrdersRepository(unit_of_work.session)
-            orders_service = OrdersService(repo)
+        async with AsyncUnitOfWork() as unit_of_work:
+            repo = AsyncOrdersRepository(unit_of_work.session)
+            orders_service = OrdersService(repo, cache=order_cache, events=order_events)
             user_order = payload.model_dump()['order']
             for item in user_order:
                 item['size'] = item['size'].value
-            updated_order = orders_service.update_order(order_id=order_id, items=user_order, user_id=request.state.user_id)
-            unit_of_work.commit()
-        user_response = update_order.dict()
+            updated_order = await orders_service.update_order(order_id=order_id, items=user_order, user_id=request.state.user_id)
+            await unit_of_work.commit()
+        user_response = updated_order.dict()
         return user_response
     except OrderNotFoundError:
         raise HTTPException(status_code=404, detail=f"Order with id: {order_id} not found")
@@ -72,13 +310,13 @@ def update_order(request: Request, order_id: UUID, payload: CreateOrderSchema):
     status_code=status.HTTP_204_NO_CONTENT,
     response_class=Response,
 )
-def delete_order(request: Request, order_id: UUID):
+async def delete_order(request: Request, order_id: UUID):
     try:
-        with UnitOfWork() as unit_of_work:
-            repo = OrdersRepository(unit_of_work.session)
-            orders_service = OrdersService(repo)
-            orders_service.delete_order(order_id=order_id, user_id=request.state.user_id)
-            unit_of_work.commit()
+        async with AsyncUnitOfWork() as unit_of_work:
+            repo = AsyncOrdersRepository(unit_of_work.session)
+            orders_service = OrdersService(repo, cache=order_cache, events=order_events)
+            await orders_service.delete_order(order_id=order_id, user_id=request.state.user_id)
+            await unit_of_work.commit()
         return
     except OrderNotFoundError:
         raise HTTPException(
@@ -87,34 +325,111 @@ def delete_order(request: Request, order_id: UUID):
 
 
 @app.post("/orders/{order_id}/cancel", response_model=GetOrderSchema)
-def cancel_order(request: Request, order_id: UUID):
+async def cancel_order(request: Request, order_id: UUID):
     try:
-        with UnitOfWork() as unit_of_work:
-            repo = OrdersRepository(unit_of_work.session)
-            orders_service = OrdersService(repo)
-            cancel_order = orders_service.cancel_order(order_id=order_id, user_id=request.state.user_id)
-            unit_of_work.commit()
+        async with AsyncUnitOfWork() as unit_of_work:
+            repo = AsyncOrdersRepository(unit_of_work.session)
+            orders_service = OrdersService(repo, cache=order_cache, events=order_events)
+            cancel_order = await orders_service.cancel_order(order_id=order_id, user_id=request.state.user_id)
+            await unit_of_work.commit()
             user_response = cancel_order.dict()
         return user_response
     except OrderNotFoundError:
         raise HTTPException(
             status_code=404, detail=f"Order with ID {order_id} not found"
         )
+    except InvalidActionError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    # An order already sent to the kitchen is cancelled there too, nothing is committed when that fails
+    except CircuitOpenError as error:
+        raise HTTPException(status_code=503, detail=str(error))
+    except APIIntegrationError as error:
+        raise HTTPException(status_code=502, detail=str(error))
 
 
-@app.post("/orders/{order_id}/pay", response_model=GetOrderSchema)
-def pay_order(request: Request, order_id: UUID):
+@app.post("/orders/{order_id}/pay", status_code=status.HTTP_202_ACCEPTED, response_model=GetOrderSchema)
+async def pay_order(request: Request, order_id: UUID):
     try:
-        with UnitOfWork() as unit_of_work:
-            repo = OrdersRepository(unit_of_work.session)
-            orders_service = OrdersService(repo)
-            order_pay = orders_service.pay_order(order_id=order_id, user_id=request.state.user_id)
-            unit_of_work.commit()
+        async with AsyncUnitOfWork() as unit_of_work:
+            repo = AsyncOrdersRepository(unit_of_work.session)
+            outbox = OutboxRepository(unit_of_work.session)
+            orders_service = OrdersService(repo, outbox, cache=order_cache, events=order_events)
+            order_pay = await orders_service.pay_order(order_id=order_id, user_id=request.state.user_id)
+            await unit_of_work.commit()
             user_response = order_pay.dict()
+        # Payment and scheduling run in the background once the outbox message is committed
+        outbox_dispatcher.notify()
         return user_response
     except OrderNotFoundError:
         raise HTTPException(
             status_code=404, detail=f"Order with ID {order_id} not found"
         )
+    except InvalidActionError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """ Return the metrics of this process in the Prometheus text format """
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def authorize_profiles(request):
+    if not BaseConfig.PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiling.is_admin(request.headers.get(profiling.TOKEN_HEADER)):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """ Return the stored profiles, newest first """
+    authorize_profiles(request)
+    return {'profiles': await asyncio.to_thread(profiling.profile_store.list)}
+
+
+@app.get("/admin/profiles/{name}", response_class=FileResponse)
+async def get_profile(request: Request, name: str):
+    """ Download a profile, pstats are read with pstats.Stats and collapsed stacks with flamegraph.pl or speedscope """
+    authorize_profiles(request)
+    path = profiling.profile_store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found")
+    return FileResponse(path, media_type='application/octet-stream', filename=name)
+
+
+def authorize_admin(request):
+    if not BaseConfig.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not auth.is_admin(request.headers.get(auth.ADMIN_TOKEN_HEADER)):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/db/pool")
+async def get_pool_stats(request: Request):
+    """ Return the usage of the shared database connection pool """
+    authorize_admin(request)
+    return pool_stats()
+
+
+@app.get("/integrations/stats")
+async def get_integrations_stats(request: Request):
+    """ Return the latency and circuit state of the kitchen and payments integrations """
+    authorize_admin(request)
+    return {**clients_stats(), 'kitchen_batching': schedule_batcher.stats()}
+
+
+@app.get("/auth/cache")
+async def get_token_cache_stats(request: Request):
+    """ Return the hit and miss counts of the verified token cache """
+    authorize_admin(request)
+    return auth.token_cache.stats()
+
 
-    
\ No newline at end of file
+@app.get("/cache/orders")
+async def get_order_cache_stats(request: Request):
+    """ Return the hit rate of the read-through cache of GET /orders/{order_id} """
+    authorize_admin(request)
+    if order_cache is None:
+        return {'backend': 'off'}
+    return order_cache.stats()
@@ -1,12 +1,95 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 
 import jwt 
 from cryptography.x509 import load_pem_x509_certificate
 
+from orders.config import BaseConfig
+
 public_key_text = (Path(__file__).parent / "../../../public_key.pem").read_text()
 public_key = load_pem_x509_certificate(public_key_text.encode()).public_key()
 
 def decode_and_validate_token(access_token):
     """Decodes and validates an access_token. If token is valid, returns token payload"""
 
-    return jwt.decode(access_token, key=public_key, algorithms=['RS256'], audience=["http://127.0.0.1:8000/orders"],)
\ No newline at end of file
+    return jwt.decode(access_token, key=public_key, algorithms=['RS256'], audience=["http://127.0.0.1:8000/orders"],)
+
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def is_admin(token):
+    """ Whether a token is the admin token, no token is when ADMIN_TOKEN is not set """
+    return bool(BaseConfig.ADMIN_TOKEN) and token is not None and hmac.compare_digest(
+        token.encode(), BaseConfig.ADMIN_TOKEN.encode()
+    )
+
+
+class TokenCache:
+    """ Bounded LRU cache of verified token payloads, keyed by the SHA-256 of the token """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(access_token):
+        return hashlib.sha256(access_token.encode()).hexdigest()
+
+    def get(self, access_token):
+        """ Return the cached payload of a token, or None if it must be verified """
+        key = self.key(access_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                payload, expires_at = entry
+                if time.time() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, access_token, payload):
+        key = self.key(access_token)
+        now = time.time()
+        # The entry never outlives the token, so expired tokens go back through verification
+        expires_at = min(payload.get("exp", now), now + self.ttl)
+        with self._lock:
+            if expires_at <= now:
+                return
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+token_cache = TokenCache(BaseConfig.JWT_CACHE_SIZE, BaseConfig.JWT_CACHE_TTL)
+
+
+def validate_token_cached(access_token):
+    """ Returns the token payload, verifying the signature only when it is not cached """
+    payload = token_cache.get(access_token)
+    if payload is None:
+        payload = decode_and_validate_token(access_token)
+        token_cache.put(access_token, payload)
+    return payload
@@ -0,0 +1,17 @@
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONResponse(Response):
+    """ JSON response encoded with orjson, for content that needs no validation nor conversion
+
+    orjson encodes datetimes and UUIDs itself, so the repository output is passed as is.
+    """
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content)
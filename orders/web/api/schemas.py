@@ -5,6 +5,8 @@ from uuid import UUID
 
 from pydantic import BaseModel, Field, conint, conlist, validator, Extra
 
+from orders.config import BaseConfig
+
 
 class Size(Enum):
     small = "small"
@@ -14,12 +16,22 @@ class Size(Enum):
 
 class Status(Enum):
     created = "created"
+    payment_pending = "payment_pending"
+    payment_failed = "payment_failed"
+    paid = "paid"
+    schedule_failed = "schedule_failed"
+    scheduled = "scheduled"
     progress = "progress"
     cancelled = "cancelled"
     dispatched = "dispatched"
     delivered = "delivered"
 
 
+class ExportFormat(Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
 class OrderItemSchema(BaseModel):
     product: str
     size: Size
@@ -47,5 +59,34 @@ class GetOrderSchema(CreateOrderSchema):
     status: Status
 
 
+class OrderEventSchema(BaseModel):
+    id: UUID
+    # A Status, or deleted for the last event of a deleted order
+    status: str
+    version: int
+
+
 class GetOrdersSchema(BaseModel):
     orders: List[GetOrderSchema]
+    # Opaque cursor to pass back to fetch the next page, null on the last page
+    next_cursor: Optional[str] = None
+
+
+class CreateOrdersBatchSchema(BaseModel):
+    # Each order is validated on its own, so that one invalid order does not reject the batch
+    orders: conlist(dict, min_length=1, max_length=BaseConfig.MAX_BATCH_SIZE)
+
+    class Config:
+        extra = Extra.forbid
+
+
+class BatchOrderResultSchema(BaseModel):
+    # Position of the order in the request
+    index: int
+    status: int
+    order: Optional[GetOrderSchema] = None
+    errors: Optional[list] = None
+
+
+class CreateOrdersBatchResultSchema(BaseModel):
+    results: List[BatchOrderResultSchema]
@@ -1,12 +1,10 @@
+import time
 from pathlib import Path
-import os
 
 import yaml
 from fastapi import FastAPI, status
-from fastapi.requests import Request
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import (RequestResponseEndpoint, BaseHTTPMiddleware)
 from jwt import (
     ExpiredSignatureError,
     ImmatureSignatureError,
@@ -19,44 +17,73 @@ from jwt import (
 )
 
 from .api import auth
+from orders import metrics, profiling
+from orders.config import BaseConfig
+from orders.orders_service.batching import schedule_batcher
+from orders.orders_service.http_client import close_clients
+from orders.orders_service.outbox import outbox_dispatcher
+from orders.repository.unit_of_work import dispose_async_engine, dispose_engine
 
 app = FastAPI(debug=True, openapi_url="/openapi/orders.json", docs_url="/docs/orders")
 
-# Create the middleware class to inherit from starlette base class
-class AuthorizeRequestMiddleware(BaseHTTPMiddleware):
+# Raw ASGI middleware: no request/response wrapping and no extra task per request,
+# so streaming responses pass through untouched
+class AuthorizeRequestMiddleware:
+
+    # The documentation endpoints should not be authorized, nor the metrics, which are scraped
+    # without a user token
+    public_paths = frozenset(["/docs/orders", "/openapi/orders.json", "/metrics"])
+
+    def __init__(self, app, auth_on=None):
+        self.app = app
+        # Configuration is read once, when the application starts
+        self.auth_on = BaseConfig.AUTH_ON if auth_on is None else auth_on
 
     # Middleware entry point
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # request.state is backed by this dict
+        state = scope.setdefault("state", {})
 
         # Do not authorize the request if AUTH_ON is false
-        if os.getenv("AUTH_ON", "False") != "True":
+        if not self.auth_on:
         # If authorization is off, bind a default user named test to the request
-            request.state.user_id = "test"
+            state["user_id"] = "test"
             # Pass the request to the path operations
-            return await call_next(request)
+            return await self.app(scope, receive, send)
 
-        # The documentation endpoints should not be authorized
-        if request.url.path in ["/docs/orders", "/openapi/orders.json"]:
-            return await call_next(request)
-        
         # According to specifications, Options should not be authorized
-        if request.method == "OPTIONS":
-            return await call_next(request)
+        if scope["path"] in self.public_paths or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
 
         # Attempt to fetch the authorization header
-        bearer_token = request.headers.get("Authorization")
+        bearer_token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                bearer_token = value.decode("latin-1")
+                break
         # If not set, return a 401 (Unauthorized) response
         if not bearer_token:
-            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={
+            response = JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={
                 "detail": "Missing access token",
                 "body": "Missing access token",
             },)
+            return await response(scope, receive, send)
 
         try:
             # Capture the token from the authorization header
-            auth_token = bearer_token.split(" ")[1].strip()
-            # Validate and retrieve the token's payload
-            token_payload = auth.decode_and_validate_token(auth_token)
+            auth_token = bearer_token.partition(" ")[2].strip()
+            if not auth_token:
+                raise InvalidTokenError("Invalid authorization header")
+            # Signatures are verified once per token, then served from the token cache
+            if metrics.full():
+                start = time.perf_counter()
+                token_payload = auth.validate_token_cached(auth_token)
+                metrics.auth_seconds.observe(time.perf_counter() - start)
+            else:
+                token_payload = auth.validate_token_cached(auth_token)
         # If the token is invalid, return a 401 (Unauthorize) response
         except(
             ExpiredSignatureError,
@@ -68,13 +95,13 @@ class AuthorizeRequestMiddleware(BaseHTTPMiddleware):
             InvalidTokenError,
             MissingRequiredClaimError,
         ) as error:
-            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": str(error), "body": str(error)})
+            response = JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": str(error), "body": str(error)})
+            return await response(scope, receive, send)
 
-        else: 
-            # extract the user_id from the token's subject field
-            request.state.user_id = token_payload["sub"]
+        # extract the user_id from the token's subject field
+        state["user_id"] = token_payload["sub"]
 
-        return await call_next(request)
+        return await self.app(scope, receive, send)
 
 app.add_middleware(AuthorizeRequestMiddleware)
 
@@ -86,8 +113,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiles include the authorization of the request
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# Outermost, so that the time of the other middlewares is part of the request time
+app.add_middleware(metrics.MetricsMiddleware)
+
 oas_doc = yaml.safe_load((Path(__file__).parent / "../../orders.yaml").read_text())
 
 app.openapi = lambda: oas_doc
 
+
+@app.on_event("startup")
+async def start_outbox_dispatcher():
+    outbox_dispatcher.start()
+
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    # Release the pooled database and HTTP connections when the server stops
+    await outbox_dispatcher.stop()
+    await schedule_batcher.close()
+    await dispose_async_engine()
+    dispose_engine()
+    await close_clients()
+
 from orders.web.api import api
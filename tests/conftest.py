@@ -0,0 +1,123 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from orders.config import BaseConfig, async_database_url
+from orders.repository import models
+from orders.repository.orders_repository import _bulk_rows
+from orders.repository.unit_of_work import dispose_async_engine
+from orders.web.app import app
+
+from api import api as kitchen_api
+from api.store import ScheduleStore
+from app import app as kitchen_app
+
+ITEMS = [{"product": "latte", "size": "big", "quantity": 2}]
+
+
+class OrdersDatabase:
+    """ Scratch SQLite database of the orders service, seeded synchronously and used from async code
+
+    Async engines belong to the event loop they are used on, so each test creates its own
+    with async_engine() or session() inside asyncio.run().
+    """
+
+    def __init__(self, path):
+        self.url = f"sqlite:///{path}"
+        self.async_url = async_database_url(self.url)
+        self.engine = create_engine(self.url)
+        models.Base.metadata.create_all(self.engine)
+
+    def seed(self, count=1, items=ITEMS, status="created", user_id="test", schedule_id=None):
+        """ Insert count orders with the same items, returning their ids """
+        order_rows, item_rows, _ = _bulk_rows([items] * count, user_id)
+        for row in order_rows:
+            row["status"] = status
+            row["schedule_id"] = schedule_id
+        with self.engine.begin() as connection:
+            connection.execute(insert(models.OrderModel), order_rows)
+            connection.execute(insert(models.OrderItemModel), item_rows)
+        return [row["id"] for row in order_rows]
+
+    def statuses(self):
+        """ Return the status of every order, by id """
+        with self.engine.connect() as connection:
+            return dict(connection.execute(select(models.OrderModel.id, models.OrderModel.status)).all())
+
+    def async_engine(self):
+        return create_async_engine(self.async_url)
+
+    @asynccontextmanager
+    async def session(self, engine=None):
+        """ Open an AsyncSession, on a new engine disposed afterwards unless one is given """
+        owned = engine is None
+        engine = engine or self.async_engine()
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                yield session
+        finally:
+            if owned:
+                await engine.dispose()
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+@pytest.fixture
+def orders_db_factory(tmp_path):
+    """ Create scratch orders databases by name """
+    databases = []
+
+    def create(name="orders"):
+        database = OrdersDatabase(tmp_path / f"{name}.db")
+        databases.append(database)
+        return database
+
+    yield create
+    for database in databases:
+        database.dispose()
+
+
+@pytest.fixture
+def orders_db(orders_db_factory):
+    return orders_db_factory()
+
+
+@pytest.fixture
+def orders_app(orders_db, monkeypatch):
+    """ Point the orders app at the scratch database, with authorization off """
+    monkeypatch.setattr(BaseConfig, "AUTH_ON", False)
+    monkeypatch.setattr(BaseConfig, "DATABASE_URL", orders_db.url)
+    monkeypatch.setattr(BaseConfig, "ASYNC_DATABASE_URL", orders_db.async_url)
+    monkeypatch.setattr(BaseConfig, "REPLICA_DATABASE_URL", None)
+    monkeypatch.setattr(BaseConfig, "DB_READ_POOL", False)
+    # The process-wide engines are created again from the patched configuration
+    asyncio.run(dispose_async_engine())
+    yield orders_db
+    asyncio.run(dispose_async_engine())
+
+
+@pytest.fixture
+def call():
+    """ Return a coroutine function sending (method, path, options) requests to the orders app """
+    async def call(*requests):
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return [await client.request(method, path, **options) for method, path, options in requests]
+        finally:
+            # The engines belong to the event loop of this call
+            await dispose_async_engine()
+
+    return call
+
+
+@pytest.fixture
+def kitchen_client(monkeypatch):
+    """ Return a test client of the kitchen app, serving an empty in-memory schedule store """
+    monkeypatch.setattr(kitchen_api, "schedules", ScheduleStore())
+    return kitchen_app.test_client()
@@ -0,0 +1,36 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.responses import PlainTextResponse
+
+from orders.config import BaseConfig
+from orders.web.app import AuthorizeRequestMiddleware, app
+
+ADMIN_PATHS = ["/db/pool", "/integrations/stats", "/auth/cache", "/cache/orders"]
+
+
+async def get(app, path, headers=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+@pytest.mark.parametrize("path", ADMIN_PATHS)
+def test_admin_endpoints_are_disabled_without_an_admin_token(monkeypatch, path):
+    monkeypatch.setattr(BaseConfig, "ADMIN_TOKEN", None)
+    assert asyncio.run(get(app, path)).status_code == 404
+
+
+@pytest.mark.parametrize("path", ADMIN_PATHS)
+def test_admin_endpoints_require_the_admin_token(monkeypatch, path):
+    monkeypatch.setattr(BaseConfig, "ADMIN_TOKEN", "secret")
+    assert asyncio.run(get(app, path)).status_code == 403
+    assert asyncio.run(get(app, path, {"X-Admin-Token": "guess"})).status_code == 403
+    assert asyncio.run(get(app, path, {"X-Admin-Token": "secret"})).status_code == 200
+
+
+def test_metrics_are_scraped_without_an_access_token():
+    middleware = AuthorizeRequestMiddleware(PlainTextResponse("ok"), auth_on=True)
+    assert asyncio.run(get(middleware, "/metrics")).status_code == 200
+    assert asyncio.run(get(middleware, "/orders")).status_code == 401
@@ -0,0 +1,85 @@
+import asyncio
+
+import httpx
+import pytest
+
+from orders.config import BaseConfig
+from orders.orders_service import orders
+from orders.orders_service.exceptions import APIIntegrationError, InvalidActionError
+from orders.orders_service.http_client import ServiceClient
+from orders.orders_service.orders_service import OrdersService
+from orders.repository.orders_repository import AsyncOrdersRepository
+
+
+async def cancel(orders_db, order_id):
+    """ Cancel an order, returning the error raised if any """
+    async with orders_db.session() as session:
+        try:
+            await OrdersService(AsyncOrdersRepository(session)).cancel_order(order_id, "test")
+            await session.commit()
+        except (APIIntegrationError, InvalidActionError) as error:
+            return error
+
+
+@pytest.fixture
+def kitchen(monkeypatch):
+    """ Stub kitchen service answering with status, recording the paths it is called on """
+
+    class Kitchen:
+
+        def __init__(self):
+            self.status = 200
+            self.paths = []
+
+        def __call__(self, request):
+            self.paths.append(request.url.path)
+            return httpx.Response(self.status)
+
+    stub = Kitchen()
+    monkeypatch.setattr(orders, "kitchen_client", ServiceClient("kitchen", "http://test", transport=httpx.MockTransport(stub)))
+    return stub
+
+
+@pytest.mark.parametrize("status", ["created", "cancelled"])
+def test_cancel_order(orders_db, status):
+    order_id, = orders_db.seed(status=status)
+    assert asyncio.run(cancel(orders_db, order_id)) is None
+    assert orders_db.statuses() == {order_id: "cancelled"}
+
+
+@pytest.mark.parametrize("status", ["payment_pending", "paid", "delivery"])
+def test_cancel_order_is_rejected_while_paying_or_delivering(orders_db, status):
+    order_id, = orders_db.seed(status=status)
+    assert isinstance(asyncio.run(cancel(orders_db, order_id)), InvalidActionError)
+    assert orders_db.statuses() == {order_id: status}
+
+
+@pytest.mark.parametrize("status", ["scheduled", "progress"])
+def test_cancel_order_cancels_its_schedule(orders_db, kitchen, status):
+    order_id, = orders_db.seed(status=status, schedule_id="schedule")
+    assert asyncio.run(cancel(orders_db, order_id)) is None
+    assert kitchen.paths == ["/schedules/schedule/cancel"]
+    assert orders_db.statuses() == {order_id: "cancelled"}
+
+
+def test_cancel_order_is_left_unchanged_when_the_kitchen_fails(orders_db, kitchen, monkeypatch):
+    monkeypatch.setattr(BaseConfig, "HTTP_MAX_RETRIES", 0)
+    kitchen.status = 503
+    order_id, = orders_db.seed(status="scheduled", schedule_id="schedule")
+    assert isinstance(asyncio.run(cancel(orders_db, order_id)), APIIntegrationError)
+    assert orders_db.statuses() == {order_id: "scheduled"}
+
+
+@pytest.mark.parametrize("circuit, status_code", [("closed", 502), ("open", 503)])
+def test_cancel_endpoint_reports_kitchen_failures(orders_app, call, kitchen, monkeypatch, circuit, status_code):
+    monkeypatch.setattr(BaseConfig, "HTTP_MAX_RETRIES", 0)
+    kitchen.status = 503
+    if circuit == "open":
+        for _ in range(orders.kitchen_client.breaker.threshold):
+            orders.kitchen_client.breaker.record_failure()
+    order_id, = orders_app.seed(status="scheduled", schedule_id="schedule")
+
+    response, = asyncio.run(call(("POST", f"/orders/{order_id}/cancel", {})))
+
+    assert response.status_code == status_code
+    assert orders_app.statuses() == {order_id: "scheduled"}
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+ORDER = {"order": [{"product": "latte", "size": "small", "quantity": 1}]}
+
+
+def test_order_is_not_sent_again_while_its_etag_matches(orders_app, call):
+    order_id, = orders_app.seed()
+    path = f"/orders/{order_id}"
+    first, = asyncio.run(call(("GET", path, {})))
+    etag = first.headers["etag"]
+
+    matches = [f"W/{etag}", f'"other", {etag}', "*"]
+    responses = asyncio.run(call(*(("GET", path, {"headers": {"If-None-Match": match}}) for match in matches)))
+    assert [(response.status_code, response.headers["etag"], response.content) for response in responses] == [(304, etag, b"")] * 3
+
+    updated, conditional = asyncio.run(call(
+        ("PUT", path, {"json": ORDER}),
+        ("GET", path, {"headers": {"If-None-Match": etag}}),
+    ))
+    assert updated.status_code == 200
+    assert conditional.status_code == 200
+    assert conditional.headers["etag"] != etag
+    assert conditional.json()["order"] == ORDER["order"]
+
+
+@pytest.mark.parametrize("suffix", ["", "/status"])
+def test_schedule_is_not_sent_again_while_its_etag_matches(kitchen_client, suffix):
+    schedule_id = kitchen_client.post("/kitchen/schedules", json=ORDER).get_json()["id"]
+    path = f"/kitchen/schedules/{schedule_id}{suffix}"
+    etag = kitchen_client.get(path).headers["ETag"]
+
+    assert kitchen_client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    kitchen_client.post(f"/kitchen/schedules/{schedule_id}/cancel")
+    response = kitchen_client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["status"] == "cancelled"
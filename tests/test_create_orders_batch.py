@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from orders.repository import orders_repository
+
+ORDER = {"order": [{"product": "latte", "size": "big", "quantity": 2}]}
+
+
+def create(call, orders):
+    response, = asyncio.run(call(("POST", "/orders:batch", {"json": {"orders": orders}})))
+    return response
+
+
+def test_valid_orders_are_created_and_invalid_ones_reported(orders_app, call):
+    invalid = {"order": [{"product": "latte", "size": "huge", "quantity": 2}]}
+
+    response = create(call, [ORDER, invalid, ORDER])
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(result["index"], result["status"]) for result in results] == [(0, 201), (1, 422), (2, 201)]
+    assert results[1]["errors"][0]["loc"][-1] == "size"
+    assert orders_app.statuses() == {results[0]["order"]["id"]: "created", results[2]["order"]["id"]: "created"}
+
+
+@pytest.mark.parametrize("count", [0, 501])
+def test_batches_outside_of_the_size_limits_are_rejected(orders_app, call, count):
+    assert create(call, [ORDER] * count).status_code == 422
+    assert orders_app.statuses() == {}
+
+
+def test_batch_is_rolled_back_when_an_insert_fails(orders_app, call, monkeypatch):
+    bulk_rows = orders_repository._bulk_rows
+
+    def duplicate_item(orders, user_id):
+        # The items are inserted after the orders, the repeated primary key fails that second insert
+        order_rows, item_rows, results = bulk_rows(orders, user_id)
+        return order_rows, item_rows + item_rows[-1:], results
+
+    monkeypatch.setattr(orders_repository, "_bulk_rows", duplicate_item)
+
+    with pytest.raises(IntegrityError):
+        create(call, [ORDER, ORDER])
+    assert orders_app.statuses() == {}
@@ -0,0 +1,65 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from orders.config import BaseConfig
+from orders.repository import orders_repository
+
+ITEMS = [{"product": "latte", "size": "big", "quantity": 2}, {"product": "mocha", "size": "small", "quantity": 1}]
+
+
+@pytest.fixture
+def item_queries(monkeypatch):
+    """ Count the item queries of the exports, one per batch of orders """
+    queries = []
+    items_query = orders_repository._items_query
+
+    def counted(order_ids):
+        queries.append(len(order_ids))
+        return items_query(order_ids)
+
+    monkeypatch.setattr(orders_repository, "_items_query", counted)
+    return queries
+
+
+def export(call, **params):
+    response, = asyncio.run(call(("GET", "/orders/export", {"params": params})))
+    assert response.status_code == 200
+    return response
+
+
+def test_ndjson_export_is_read_in_batches_oldest_first(orders_app, call, monkeypatch, item_queries):
+    monkeypatch.setattr(BaseConfig, "EXPORT_BATCH_SIZE", 2)
+    order_ids = orders_app.seed(5, items=ITEMS)
+
+    response = export(call)
+    orders = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [order["id"] for order in orders] == order_ids
+    assert all(order["order"] == ITEMS and order["status"] == "created" for order in orders)
+    assert item_queries == [2, 2, 1]
+
+
+def test_export_resumes_from_the_created_date_of_an_order(orders_app, call):
+    order_ids = orders_app.seed(5)
+    orders = [json.loads(line) for line in export(call).text.splitlines()]
+
+    resumed = [json.loads(line) for line in export(call, since=orders[2]["created"]).text.splitlines()]
+
+    assert [order["id"] for order in resumed] == order_ids[2:]
+
+
+def test_csv_export_has_a_row_per_item(orders_app, call):
+    order_ids = orders_app.seed(2, items=ITEMS)
+
+    response = export(call, format="csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+
+    assert response.headers["content-type"].startswith("text/csv")
+    assert [(row["id"], row["product"], row["quantity"]) for row in rows] == [
+        (order_id, item["product"], str(item["quantity"])) for order_id in order_ids for item in ITEMS
+    ]
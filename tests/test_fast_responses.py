@@ -0,0 +1,22 @@
+import asyncio
+
+import pytest
+
+from orders.config import BaseConfig
+
+pytest.importorskip("orjson")
+
+
+@pytest.mark.parametrize("path", ["/orders", "/orders?limit=2", "/orders/{order_id}"])
+def test_fast_responses_match_the_validated_ones(orders_app, call, monkeypatch, path):
+    order_id = orders_app.seed(3)[0]
+    path = path.format(order_id=order_id)
+
+    validated, = asyncio.run(call(("GET", path, {})))
+    monkeypatch.setattr(BaseConfig, "FAST_RESPONSES", True)
+    fast, = asyncio.run(call(("GET", path, {})))
+
+    assert fast.status_code == validated.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.headers.get("etag") == validated.headers.get("etag")
+    assert fast.json() == validated.json()
@@ -0,0 +1,100 @@
+import asyncio
+
+import httpx
+import pytest
+
+from orders.config import BaseConfig
+from orders.orders_service.exceptions import APIIntegrationError, CircuitOpenError
+from orders.orders_service.http_client import ServiceClient
+
+
+class Downstream:
+    """ Stub service answering with the given statuses in turn, the last one repeated """
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def __call__(self, request):
+        status = self.statuses[min(self.calls, len(self.statuses) - 1)]
+        self.calls += 1
+        if status is None:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(status)
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    monkeypatch.setattr(BaseConfig, "HTTP_MAX_RETRIES", 2)
+    monkeypatch.setattr(BaseConfig, "HTTP_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(BaseConfig, "HTTP_BREAKER_THRESHOLD", 2)
+    monkeypatch.setattr(BaseConfig, "HTTP_BREAKER_RESET", 30)
+
+    def client_for(downstream):
+        return ServiceClient("test", "http://test", transport=httpx.MockTransport(downstream))
+
+    return client_for
+
+
+async def send(client, *calls):
+    """ Make the calls in turn, returning the status or the error type of each """
+    results = []
+    try:
+        for method, idempotent in calls:
+            try:
+                response = await client.request(method, "/", idempotent=idempotent)
+                results.append(response.status_code)
+            except APIIntegrationError as error:
+                results.append(type(error))
+    finally:
+        await client.aclose()
+    return results
+
+
+def test_only_idempotent_calls_are_retried(client_for):
+    downstream = Downstream(503, 503, 200)
+    assert asyncio.run(send(client_for(downstream), ("GET", True))) == [200]
+    assert downstream.calls == 3
+
+    downstream = Downstream(503, 200)
+    assert asyncio.run(send(client_for(downstream), ("POST", False))) == [503]
+    assert downstream.calls == 1
+
+
+def test_breaker_counts_one_failure_per_call(client_for):
+    downstream = Downstream(None)
+    client = client_for(downstream)
+    results = asyncio.run(send(client, ("GET", True)))
+    # Three attempts of one call leave the circuit closed under a threshold of two
+    assert results == [APIIntegrationError]
+    assert downstream.calls == 3
+    assert client.breaker.failures == 1
+    assert client.breaker.state == "closed"
+
+
+def test_breaker_opens_at_threshold(client_for):
+    downstream = Downstream(500)
+    client = client_for(downstream)
+    results = asyncio.run(send(client, ("POST", False), ("POST", False), ("POST", False)))
+    assert results == [500, 500, CircuitOpenError]
+    assert downstream.calls == 2
+    assert client.breaker.state == "open"
+
+
+@pytest.mark.parametrize("trial, state", [(200, "closed"), (500, "open")])
+def test_half_open_breaker_lets_one_trial_call_through(client_for, trial, state):
+    downstream = Downstream(500, 500, trial)
+    client = client_for(downstream)
+    asyncio.run(send(client, ("POST", False), ("POST", False)))
+    client.breaker.opened_at -= BaseConfig.HTTP_BREAKER_RESET
+    assert client.breaker.state == "half-open"
+
+    results = asyncio.run(send(client, ("POST", False), ("POST", False)))
+    if trial == 200:
+        assert results == [200, 200]
+        assert downstream.calls == 4
+    else:
+        # The failed trial opens the circuit again, the next call is short-circuited
+        assert results == [500, CircuitOpenError]
+        assert downstream.calls == 3
+    assert client.breaker.state == state
@@ -0,0 +1,113 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+from config import BaseConfig
+from repository import unit_of_work
+from repository.durable_store import DurableScheduleStore, GroupCommitWriter
+
+
+@pytest.fixture
+def kitchen_db(tmp_path, monkeypatch):
+    """ Point the kitchen at a scratch SQLite database, with a fresh process-wide engine """
+    monkeypatch.setattr(BaseConfig, "DATABASE_URL", f"sqlite:///{tmp_path / 'kitchen.db'}")
+    monkeypatch.setattr(unit_of_work, "_engine", None)
+    monkeypatch.setattr(unit_of_work, "_Session", None)
+    yield
+    if unit_of_work._engine is not None:
+        unit_of_work._engine.dispose()
+
+
+def schedule(number, status="pending"):
+    return {
+        "id": f"schedule-{number:03}",
+        "scheduled": datetime(2026, 1, 1, 12, number),
+        "status": status,
+        "order": [{"product": "latte", "size": "big", "quantity": number}],
+    }
+
+
+def observations(histogram):
+    """ Return how many values a histogram without labels observed, and their sum """
+    counts, total = histogram._values.get((), ([], 0.0))
+    return sum(counts), total
+
+
+def test_group_commits_are_timed(kitchen_db, monkeypatch):
+    monkeypatch.setattr(BaseConfig, "METRICS", "full")
+    commits, seconds = observations(metrics.db_group_commits)
+    batches, writes = observations(metrics.db_group_commit_writes)
+
+    writer = GroupCommitWriter()
+    store = DurableScheduleStore(writer)
+    store.add_many([schedule(1), schedule(2)])
+    store.update("schedule-001", status="progress")
+    writer.close()
+
+    # Each write is waited for before the next one is queued, so each has its own commit
+    assert observations(metrics.db_group_commits)[0] == commits + 2
+    assert observations(metrics.db_group_commits)[1] > seconds
+    assert observations(metrics.db_group_commit_writes) == (batches + 2, writes + 2)
+
+
+class RecordingWriter(GroupCommitWriter):
+    """ Group commit writer recording the number of writes of each commit """
+
+    def __init__(self, **options):
+        self.commits = []
+        super().__init__(**options)
+
+    def _commit(self, batch):
+        self.commits.append(len(batch))
+        super()._commit(batch)
+
+
+def restart():
+    """ Drop the process-wide engine, as a new kitchen process would start without one """
+    unit_of_work._engine.dispose()
+    unit_of_work._engine = unit_of_work._Session = None
+
+
+def test_schedules_are_reloaded_after_a_restart(kitchen_db):
+    writer = GroupCommitWriter()
+    store = DurableScheduleStore(writer)
+    store.add(schedule(1))
+    store.add_many([schedule(2), schedule(3), schedule(4)])
+    store.update("schedule-002", status="progress")
+    store.update("schedule-003", scheduled=datetime(2026, 1, 1, 11))
+    store.delete("schedule-004")
+    writer.close()
+
+    restart()
+    writer = GroupCommitWriter()
+    reloaded = DurableScheduleStore(writer)
+    writer.close()
+
+    assert reloaded.list() == store.list()
+    assert [schedule["id"] for schedule in reloaded.list(status="progress")[0]] == ["schedule-002"]
+
+
+def test_queued_writes_share_a_commit(kitchen_db):
+    writer = RecordingWriter(max_delay=0.05)
+    DurableScheduleStore(writer)
+    futures = [writer.submit("add", schedule(number)) for number in range(10)]
+    for future in futures:
+        future.result()
+    writer.close()
+
+    assert writer.commits == [10]
+
+
+def test_failed_commit_brings_the_store_back_in_line_with_the_database(kitchen_db):
+    writer = GroupCommitWriter()
+    store = DurableScheduleStore(writer)
+    store.add(schedule(1))
+    # The same id again fails the INSERT, after the store has indexed the schedule
+    with pytest.raises(IntegrityError):
+        store.add({**schedule(1), "scheduled": datetime(2026, 1, 1, 13)})
+    writer.close()
+
+    page, _ = store.list()
+    assert [(schedule["id"], schedule["scheduled"]) for schedule in page] == [("schedule-001", datetime(2026, 1, 1, 12, 1))]
@@ -0,0 +1,52 @@
+import pytest
+from flask import Flask
+
+import profiling
+from config import BaseConfig
+from observability.profiling import ProfileStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(BaseConfig, "PROFILING", "cprofile")
+    monkeypatch.setattr(BaseConfig, "PROFILING_TOKEN", "secret")
+    store = ProfileStore(tmp_path, max_files=10)
+    monkeypatch.setattr(profiling, "profile_store", store)
+    return store
+
+
+@pytest.fixture
+def client(store):
+    app = Flask(__name__)
+    profiling.init_app(app)
+    app.get("/kitchen/schedules")(lambda: "ok")
+    return app.test_client()
+
+
+@pytest.mark.parametrize("sample_rate, token, profiled, sent", [
+    (0, None, False, False),
+    (100, None, True, False),
+    (0, "secret", True, True),
+    (100, "guess", False, False),
+])
+def test_profile_id_is_only_sent_with_the_profiling_token(store, client, monkeypatch, sample_rate, token, profiled, sent):
+    monkeypatch.setattr(BaseConfig, "PROFILING_SAMPLE_RATE", sample_rate)
+    response = client.get("/kitchen/schedules", headers={"X-Profile-Token": token} if token else None)
+
+    assert response.status_code == 200
+    assert len(store.list()) == int(profiled)
+    if sent:
+        assert response.headers["X-Profile-Id"] == store.list()[0]["name"]
+    else:
+        assert "X-Profile-Id" not in response.headers
+
+
+def test_profiles_are_only_served_with_the_profiling_token(store, client):
+    client.get("/kitchen/schedules", headers={"X-Profile-Token": "secret"})
+    name = store.list()[0]["name"]
+
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get(f"/admin/profiles/{name}", headers={"X-Profile-Token": "guess"}).status_code == 403
+    profiles = client.get("/admin/profiles", headers={"X-Profile-Token": "secret"}).get_json()["profiles"]
+    assert [profile["name"] for profile in profiles] == [name]
+    assert client.get(f"/admin/profiles/{name}", headers={"X-Profile-Token": "secret"}).status_code == 200
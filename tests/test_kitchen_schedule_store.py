@@ -0,0 +1,73 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from api.store import ScheduleStore, schedule_key
+
+STATUSES = ["pending", "progress", "cancelled", "finished"]
+START = datetime(2026, 1, 1)
+
+
+def expected(schedules, status=None, exclude_status=None, since=None):
+    """ The listing of the store, computed by filtering and sorting every schedule """
+    return sorted(
+        (
+            schedule for schedule in schedules.values()
+            if (status is None or schedule["status"] == status)
+            and (exclude_status is None or schedule["status"] != exclude_status)
+            and (since is None or schedule["scheduled"] >= since)
+        ),
+        key=schedule_key,
+    )
+
+
+def pages(store, limit, **filters):
+    """ Walk the listing page by page, like a client following the cursors """
+    schedules, after = [], None
+    while True:
+        page, more = store.list(after=after, limit=limit, **filters)
+        schedules.extend(page)
+        if not more:
+            return schedules
+        after = schedule_key(page[-1])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_indexes_stay_consistent_after_updates_and_deletes(seed):
+    generator = random.Random(seed)
+    store = ScheduleStore()
+    schedules = {}
+
+    for number in range(300):
+        operation = generator.choice(["add", "add", "status", "reschedule", "delete"])
+        scheduled = START + timedelta(minutes=generator.randrange(60))
+        if operation == "add" or not schedules:
+            schedule = {"id": f"schedule-{number:03}", "scheduled": scheduled, "status": generator.choice(STATUSES)}
+            schedules[schedule["id"]] = store.add(dict(schedule))
+            continue
+        schedule_id = generator.choice(sorted(schedules))
+        if operation == "status":
+            store.update(schedule_id, status=generator.choice(STATUSES))
+        elif operation == "reschedule":
+            store.update(schedule_id, scheduled=scheduled)
+        else:
+            assert store.delete(schedule_id) is schedules.pop(schedule_id)
+
+    assert len(store) == len(schedules)
+    since = START + timedelta(minutes=30)
+    for filters in ({}, {"status": "pending"}, {"exclude_status": "cancelled"}, {"status": "progress", "since": since}):
+        assert store.list(**filters) == (expected(schedules, **filters), False)
+        assert pages(store, 7, **filters) == expected(schedules, **filters)
+
+
+def test_version_counts_the_updates_of_a_schedule():
+    store = ScheduleStore()
+    store.add({"id": "schedule", "scheduled": START, "status": "pending"})
+    store.update("schedule", status="progress")
+    store.update("schedule", status="finished")
+
+    assert store.version("schedule") == (store.epoch, 3)
+    store.delete("schedule")
+    assert store.version("schedule") is None
+    assert store.update("schedule", status="cancelled") is None
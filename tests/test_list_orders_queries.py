@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from orders.orders_service.orders_service import OrdersService
+from orders.repository.orders_repository import AsyncOrdersRepository
+
+ITEMS = [
+    {"product": "latte", "size": "big", "quantity": 1},
+    {"product": "mocha", "size": "small", "quantity": 2},
+]
+
+
+async def count_list_queries(orders_db, orders):
+    engine = orders_db.async_engine()
+    statements = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async with orders_db.session(engine) as session:
+        listed, _ = await OrdersService(AsyncOrdersRepository(session)).list_orders(limit=1000, user_id="test")
+    await engine.dispose()
+
+    assert len(listed) == orders
+    assert all(len(order["order"]) == 2 for order in listed)
+    return len(statements)
+
+
+@pytest.mark.parametrize("orders", [1, 10, 200])
+def test_list_orders_runs_a_constant_number_of_queries(orders_db, orders):
+    orders_db.seed(orders, items=ITEMS)
+    # The orders, then the items of every order with a single IN query
+    assert asyncio.run(count_list_queries(orders_db, orders)) == 2
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from orders.orders_service.cache import LRUOrderCache
+from orders.orders_service.orders_service import OrdersService
+from orders.repository.orders_repository import AsyncOrdersRepository
+from orders.repository.unit_of_work import AsyncUnitOfWork, dispose_async_engine
+from orders.web.api import api
+
+
+@pytest.fixture
+def cache(orders_app, monkeypatch):
+    cache = LRUOrderCache(max_size=10, ttl=60)
+    monkeypatch.setattr(api, "order_cache", cache)
+    return cache
+
+
+async def cancel(cache, order_id):
+    async with AsyncUnitOfWork() as unit_of_work:
+        await OrdersService(AsyncOrdersRepository(unit_of_work.session), cache=cache).cancel_order(order_id, "test")
+        await unit_of_work.commit()
+
+
+def test_invalidated_order_is_not_stored_by_an_earlier_read():
+    async def race(cache):
+        _, token = await cache.get("test", "order")
+        await cache.invalidate("test", "order")
+        await cache.put("test", "order", {"status": "created"}, token)
+        return await cache.get("test", "order")
+
+    cache = LRUOrderCache(max_size=10, ttl=60)
+    assert asyncio.run(race(cache)) == (None, 1)
+
+
+def test_read_racing_a_commit_does_not_cache_the_previous_state(cache, orders_app):
+    order_id, = orders_app.seed()
+
+    class RacingRepository(AsyncOrdersRepository):
+        """ Commits the cancellation of the order after loading it, before the read caches it """
+
+        async def get(self, id_, **filters):
+            order = await super().get(id_, **filters)
+            await cancel(cache, id_)
+            return order
+
+    async def read():
+        try:
+            async with AsyncUnitOfWork(read_only=True) as unit_of_work:
+                stale, _ = await OrdersService(RacingRepository(unit_of_work.session), cache=cache).get_order_dict(order_id, "test")
+            async with AsyncUnitOfWork(read_only=True) as unit_of_work:
+                service = OrdersService(AsyncOrdersRepository(unit_of_work.session), cache=cache)
+                return stale, await service.get_order_dict(order_id, "test"), await service.get_order_version(order_id, "test")
+        finally:
+            await dispose_async_engine()
+
+    stale, (order, version), cached_version = asyncio.run(read())
+    assert stale["status"] == "created"
+    assert order["status"] == "cancelled"
+    assert cached_version == version
+    assert cache.stats()["size"] == 1
+
+
+def test_etag_of_a_changed_order_is_not_answered_from_the_cache(cache, orders_app, call):
+    order_id, = orders_app.seed()
+    path = f"/orders/{order_id}"
+
+    first, cached = asyncio.run(call(("GET", path, {}), ("GET", path, {})))
+    etag = first.headers["etag"]
+    assert cached.headers["etag"] == etag
+    assert cache.hits == 1
+
+    not_modified, = asyncio.run(call(("GET", path, {"headers": {"If-None-Match": etag}})))
+    assert not_modified.status_code == 304
+
+    cancelled, conditional = asyncio.run(call(
+        ("POST", f"{path}/cancel", {}),
+        ("GET", path, {"headers": {"If-None-Match": etag}}),
+    ))
+    assert cancelled.status_code == 200
+    assert conditional.status_code == 200
+    assert conditional.json()["status"] == "cancelled"
+    assert conditional.headers["etag"] != etag
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import httpx
+
+from orders.orders_service.events import order_events
+from orders.repository.unit_of_work import dispose_async_engine
+from orders.web.app import app
+
+
+async def while_subscribed(request, *changes):
+    """ Send request, then the changes once it is subscribed to the order events, returning its response """
+    subscriptions = order_events.stats()["subscriptions"]
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            pending = asyncio.create_task(client.request(*request))
+            while order_events.stats()["subscriptions"] == subscriptions and not pending.done():
+                await asyncio.sleep(0.01)
+            for change in changes:
+                assert (await client.request(*change)).is_success
+            return await asyncio.wait_for(pending, 5)
+    finally:
+        await dispose_async_engine()
+
+
+def test_event_stream_sends_the_current_state_then_each_change(orders_app):
+    order_id, = orders_app.seed()
+    path = f"/orders/{order_id}"
+
+    response = asyncio.run(while_subscribed(("GET", f"{path}/events"), ("POST", f"{path}/cancel"), ("DELETE", path)))
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        dict(line.split(": ", 1) for line in message.splitlines())
+        for message in response.text.split("\n\n") if message
+    ]
+    assert [(event["id"], json.loads(event["data"])["status"]) for event in events[:2]] == [("1", "created"), ("2", "cancelled")]
+    assert json.loads(events[-1]["data"])["status"] == "deleted"
+    assert order_events.stats()["subscriptions"] == 0
+
+
+def test_long_poll_returns_the_next_version(orders_app):
+    order_id, = orders_app.seed()
+    path = f"/orders/{order_id}"
+
+    response = asyncio.run(while_subscribed(("GET", f"{path}/events:poll?version=1&timeout=5"), ("POST", f"{path}/cancel")))
+
+    assert response.status_code == 200
+    assert response.json() == {"id": order_id, "status": "cancelled", "version": 2}
+
+
+def test_long_poll_answers_at_once_when_the_version_differs_and_times_out_otherwise(orders_app, call):
+    order_id, = orders_app.seed()
+    path = f"/orders/{order_id}/events:poll"
+
+    changed, unchanged = asyncio.run(call(("GET", f"{path}?version=0", {}), ("GET", f"{path}?version=1&timeout=0.05", {})))
+
+    assert changed.json() == {"id": order_id, "status": "created", "version": 1}
+    assert unchanged.status_code == 204
@@ -0,0 +1,38 @@
+import asyncio
+
+from sqlalchemy import event
+
+from orders.repository.orders_repository import AsyncOrdersRepository
+
+ITEMS = [{"product": "latte", "size": "big", "quantity": 2}]
+
+
+async def bound_quantities(orders_db):
+    """ Return the quantities bound by the writes of the repository, and the orders they leave """
+    engine = orders_db.async_engine()
+    quantities = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if "INTO order_item" in statement:
+            rows = parameters if executemany else [parameters]
+            # The quantity is the last column of the item rows
+            quantities.extend(row[-1] for row in rows)
+
+    async with orders_db.session(engine) as session:
+        repository = AsyncOrdersRepository(session)
+        order = await repository.add(ITEMS, "test")
+        await repository.add_many([ITEMS, ITEMS], "test")
+        await session.commit()
+        await repository.update(order.id, items=[{"product": "tea", "size": "small", "quantity": 3}])
+        await session.commit()
+        orders = await repository.list_dicts(user_id="test")
+    await engine.dispose()
+    return quantities, orders
+
+
+def test_quantities_are_bound_as_strings(orders_db):
+    # order_item.quantity is a String column, which asyncpg refuses to bind from an int
+    quantities, orders = asyncio.run(bound_quantities(orders_db))
+    assert quantities == ["2", "2", "2", "3"]
+    assert sorted(item["quantity"] for order in orders for item in order["order"]) == [2, 2, 3]
@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+import pytest
+
+from orders.config import BaseConfig
+from orders.orders_service import orders
+from orders.orders_service.http_client import ServiceClient
+from orders.orders_service.outbox import OutboxDispatcher
+from orders.repository.outbox_repository import OutboxRepository
+from orders.repository.unit_of_work import dispose_async_engine
+
+
+def stub_client(name, status):
+    return ServiceClient(name, "http://test", transport=httpx.MockTransport(lambda request: httpx.Response(status, json={"id": "schedule"})))
+
+
+async def dispatch(orders_db, order_id, rounds):
+    """ Add a pay_order message for an order and dispatch the outbox rounds times """
+    async with orders_db.session() as session:
+        await OutboxRepository(session).add("pay_order", order_id)
+        await session.commit()
+    dispatcher = OutboxDispatcher()
+    try:
+        return [await dispatcher.dispatch_once() for _ in range(rounds)]
+    finally:
+        await dispose_async_engine()
+
+
+@pytest.mark.parametrize("payment, kitchen, status", [
+    (503, 503, "payment_failed"),
+    (201, 503, "schedule_failed"),
+    (201, 201, "scheduled"),
+])
+def test_pay_order_message_gives_up_after_max_attempts(orders_app, monkeypatch, payment, kitchen, status):
+    monkeypatch.setattr(BaseConfig, "OUTBOX_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(BaseConfig, "OUTBOX_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(BaseConfig, "HTTP_MAX_RETRIES", 0)
+    monkeypatch.setattr(BaseConfig, "KITCHEN_BATCHING", False)
+    monkeypatch.setattr(orders, "payments_client", stub_client("payments", payment))
+    monkeypatch.setattr(orders, "kitchen_client", stub_client("kitchen", kitchen))
+    order_id, = orders_app.seed(status="payment_pending")
+
+    processed = asyncio.run(dispatch(orders_app, order_id, 4))
+
+    # A failing message is processed once per attempt, then never again
+    assert processed == ([1, 0, 0, 0] if status == "scheduled" else [1, 1, 1, 0])
+    assert orders_app.statuses() == {order_id: status}
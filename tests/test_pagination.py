@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from api import api as kitchen_api
+from api.store import schedule_key
+
+ORDER = {"order": [{"product": "latte", "size": "big", "quantity": 2}]}
+
+
+def test_orders_are_paged_newest_first(orders_app, call):
+    orders_app.seed(5)
+    everything, = asyncio.run(call(("GET", "/orders", {})))
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response, = asyncio.run(call(("GET", "/orders", {"params": params})))
+        page = response.json()
+        seen.append([order["id"] for order in page["orders"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    orders = everything.json()["orders"]
+    newest_first = [order["id"] for order in orders]
+    assert seen == [newest_first[:2], newest_first[2:4], newest_first[4:]]
+    assert [order["created"] for order in orders] == sorted((order["created"] for order in orders), reverse=True)
+
+
+def test_orders_reject_an_invalid_cursor(orders_app, call):
+    response, = asyncio.run(call(("GET", "/orders", {"params": {"cursor": "garbage"}})))
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("progress", [None, True, False])
+def test_schedules_are_paged_oldest_first(kitchen_client, progress):
+    for _ in range(5):
+        kitchen_client.post("/kitchen/schedules", json=ORDER)
+    # Schedules created in the same instant are sorted by id
+    schedule_ids = [schedule["id"] for schedule in sorted(kitchen_api.schedules.list()[0], key=schedule_key)]
+    for schedule_id in schedule_ids[1::2]:
+        kitchen_api.schedules.update(schedule_id, status="progress")
+    expected = {None: schedule_ids, True: schedule_ids[1::2], False: schedule_ids[::2]}[progress]
+
+    seen, params = [], {"limit": 2}
+    if progress is not None:
+        params["progress"] = str(progress).lower()
+    while True:
+        page = kitchen_client.get("/kitchen/schedules", query_string=params).get_json()
+        seen.extend(schedule["id"] for schedule in page["schedules"])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert seen == expected
+
+
+def test_schedules_reject_an_invalid_cursor(kitchen_client):
+    assert kitchen_client.get("/kitchen/schedules", query_string={"cursor": "garbage"}).status_code == 400
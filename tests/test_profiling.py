@@ -0,0 +1,43 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.responses import PlainTextResponse
+
+from observability.profiling import ProfileStore
+from orders import profiling
+from orders.config import BaseConfig
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(BaseConfig, "PROFILING", "cprofile")
+    monkeypatch.setattr(BaseConfig, "PROFILING_TOKEN", "secret")
+    store = ProfileStore(tmp_path, max_files=10)
+    monkeypatch.setattr(profiling, "profile_store", store)
+    return store
+
+
+async def get(headers=None):
+    middleware = profiling.ProfilingMiddleware(PlainTextResponse("ok"))
+    transport = httpx.ASGITransport(app=middleware)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/orders", headers=headers)
+
+
+@pytest.mark.parametrize("sample_rate, token, profiled, sent", [
+    (0, None, False, False),
+    (100, None, True, False),
+    (0, "secret", True, True),
+    (100, "guess", False, False),
+])
+def test_profile_id_is_only_sent_with_the_profiling_token(store, monkeypatch, sample_rate, token, profiled, sent):
+    monkeypatch.setattr(BaseConfig, "PROFILING_SAMPLE_RATE", sample_rate)
+    response = asyncio.run(get({"X-Profile-Token": token} if token else None))
+
+    assert response.status_code == 200
+    assert len(store.list()) == int(profiled)
+    if sent:
+        assert response.headers["X-Profile-Id"] == store.list()[0]["name"]
+    else:
+        assert "X-Profile-Id" not in response.headers
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert
+
+from orders.config import BaseConfig
+from orders.repository import models
+from orders.repository.unit_of_work import dispose_async_engine
+
+ITEMS = [{"product": "latte", "size": "big", "quantity": 2}]
+
+
+@pytest.fixture
+def databases(orders_db_factory, monkeypatch):
+    """ A primary and a replica SQLite database, the replica never receiving the writes of the primary """
+    primary, replica = orders_db_factory("primary"), orders_db_factory("replica")
+    monkeypatch.setattr(BaseConfig, "AUTH_ON", False)
+    monkeypatch.setattr(BaseConfig, "DATABASE_URL", primary.url)
+    monkeypatch.setattr(BaseConfig, "ASYNC_DATABASE_URL", primary.async_url)
+    monkeypatch.setattr(BaseConfig, "REPLICA_DATABASE_URL", replica.url)
+    monkeypatch.setattr(BaseConfig, "ASYNC_READ_DATABASE_URL", replica.async_url)
+    monkeypatch.setattr(BaseConfig, "DB_READ_POOL", True)
+    asyncio.run(dispose_async_engine())
+    yield {"primary": primary, "replica": replica}
+    asyncio.run(dispose_async_engine())
+
+
+def test_writes_go_to_the_primary(databases, call):
+    created, = asyncio.run(call(("POST", "/orders", {"json": {"order": ITEMS}})))
+    assert created.status_code == 201
+    order_id = created.json()["id"]
+    assert databases["primary"].statuses() == {order_id: "created"}
+    assert databases["replica"].statuses() == {}
+
+    cancelled, = asyncio.run(call(("POST", f"/orders/{order_id}/cancel", {})))
+    assert cancelled.status_code == 200
+    assert databases["primary"].statuses() == {order_id: "cancelled"}
+
+
+def test_listings_read_the_replica(databases, call):
+    primary_id, = databases["primary"].seed(status="created")
+    replica_id, = databases["replica"].seed(status="scheduled")
+    listed, = asyncio.run(call(("GET", "/orders", {})))
+    assert listed.status_code == 200
+    assert [order["id"] for order in listed.json()["orders"]] == [replica_id]
+    assert primary_id not in listed.text
+
+
+def test_get_order_reads_the_replica(databases, call):
+    # The replica lags behind the primary, which has already scheduled the order
+    order_id, = databases["replica"].seed(status="created")
+    with databases["primary"].engine.begin() as connection:
+        connection.execute(insert(models.OrderModel), [{"id": order_id, "user_id": "test", "status": "scheduled"}])
+
+    fetched, = asyncio.run(call(("GET", f"/orders/{order_id}", {})))
+    assert fetched.status_code == 200
+    assert fetched.json()["status"] == "created"
+
+
+def test_get_order_falls_back_to_the_primary(databases, call):
+    # The order has not reached the replica yet
+    order_id, = databases["primary"].seed(status="created")
+    fetched, missing = asyncio.run(call(
+        ("GET", f"/orders/{order_id}", {}),
+        ("GET", "/orders/00000000-0000-0000-0000-000000000000", {}),
+    ))
+    assert fetched.status_code == 200
+    assert fetched.json()["id"] == order_id
+    assert fetched.json()["order"] == ITEMS
+    assert missing.status_code == 404
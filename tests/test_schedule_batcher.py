@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from orders.config import BaseConfig
+from orders.orders_service import batching
+from orders.orders_service.batching import ScheduleBatcher
+from orders.orders_service.exceptions import APIIntegrationError
+from orders.orders_service.http_client import ServiceClient
+
+
+@pytest.fixture
+def kitchen(monkeypatch):
+    """ Stub kitchen creating a schedule per order of a batch, returns the sizes of the batches it got """
+    monkeypatch.setattr(BaseConfig, "HTTP_MAX_RETRIES", 0)
+    batches = []
+
+    def schedule_batch(request):
+        schedules = json.loads(request.content)["schedules"]
+        batches.append(len(schedules))
+        if schedules[0]["order"] == "fail":
+            return httpx.Response(500)
+        return httpx.Response(201, json={"schedules": [{"id": f"schedule-{schedule['order']}"} for schedule in schedules]})
+
+    monkeypatch.setattr(batching, "kitchen_client", ServiceClient("kitchen", "http://test", transport=httpx.MockTransport(schedule_batch)))
+    return batches
+
+
+async def schedule(batcher, orders):
+    """ Schedule the orders concurrently, returning the schedule ids or the errors and the seconds it took """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        results = await asyncio.gather(*(batcher.schedule(order) for order in orders), return_exceptions=True)
+    finally:
+        await batching.kitchen_client.aclose()
+    return results, loop.time() - start
+
+
+def test_full_batches_are_sent_without_waiting(kitchen):
+    batcher = ScheduleBatcher(max_size=3, max_delay=10)
+    results, seconds = asyncio.run(schedule(batcher, ["a", "b", "c", "d", "e", "f"]))
+
+    assert results == [f"schedule-{order}" for order in "abcdef"]
+    assert kitchen == [3, 3]
+    assert seconds < 1
+    assert batcher.stats() == {"batches": 2, "scheduled": 6, "avg_batch_size": 3.0}
+
+
+def test_partial_batch_is_sent_after_the_delay(kitchen):
+    batcher = ScheduleBatcher(max_size=3, max_delay=0.05)
+    results, seconds = asyncio.run(schedule(batcher, ["a", "b", "c", "d"]))
+
+    assert results == [f"schedule-{order}" for order in "abcd"]
+    assert kitchen == [3, 1]
+    assert seconds >= 0.04
+
+
+def test_failed_batch_fails_every_order_in_it(kitchen):
+    batcher = ScheduleBatcher(max_size=2, max_delay=10)
+    results, _ = asyncio.run(schedule(batcher, ["fail", "b"]))
+
+    assert kitchen == [2]
+    assert all(isinstance(result, APIIntegrationError) for result in results)
@@ -0,0 +1,57 @@
+import pytest
+
+from orders.web.api import auth
+from orders.web.api.auth import TokenCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ Replace the wall clock of the token cache with one moved by hand """
+
+    class Clock:
+        now = 1_000_000.0
+
+        def time(self):
+            return self.now
+
+    clock = Clock()
+    monkeypatch.setattr(auth.time, "time", clock.time)
+    return clock
+
+
+@pytest.mark.parametrize("exp, expires_after", [(1_000_060.0, 60), (1_001_000.0, 300), (None, 0)])
+def test_cached_payload_expires_with_the_token_or_the_ttl(clock, exp, expires_after):
+    cache = TokenCache(max_size=10, ttl=300)
+    payload = {"sub": "test"} if exp is None else {"sub": "test", "exp": exp}
+    cache.put("token", payload)
+
+    if expires_after:
+        clock.now += expires_after - 1
+        assert cache.get("token") == payload
+    clock.now += 1
+    assert cache.get("token") is None
+
+
+def test_expired_token_is_not_cached(clock):
+    cache = TokenCache(max_size=10, ttl=300)
+    cache.put("token", {"sub": "test", "exp": clock.now - 1})
+    assert cache.stats()["size"] == 0
+
+
+def test_token_is_verified_again_once_its_entry_expired(clock, monkeypatch):
+    monkeypatch.setattr(auth, "token_cache", TokenCache(max_size=10, ttl=300))
+    verified = []
+
+    def decode_and_validate_token(access_token):
+        verified.append(access_token)
+        return {"sub": "test", "exp": clock.now + 60}
+
+    monkeypatch.setattr(auth, "decode_and_validate_token", decode_and_validate_token)
+
+    for _ in range(3):
+        assert auth.validate_token_cached("token")["sub"] == "test"
+    clock.now += 60
+    auth.validate_token_cached("token")
+
+    assert verified == ["token", "token"]
+    assert auth.token_cache.stats()["hits"] == 2